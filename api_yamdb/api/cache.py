@@ -0,0 +1,200 @@
+import hashlib
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import parse_etags
+from django.utils.http import urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+from reviews.constants import RESPONSE_CACHE_TIMEOUT
+
+TITLES = 'titles'
+GENRES = 'genres'
+CATEGORIES = 'categories'
+# Поднимается пересчётом взвешенного рейтинга всех произведений сразу.
+WEIGHTED_RATINGS = 'weighted_ratings'
+# Версии индексов в памяти процесса (api.indexes): связи жанр-произведение
+# и названия произведений.
+GENRE_LINKS = 'genre_links'
+TITLE_NAMES = 'title_names'
+
+
+# Бэкенды, которые другие воркеры не видят.
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def shared_cache():
+    """
+    Общий ли кэш для всех воркеров.
+
+    Версии в кэше процесса другие воркеры не поднимают: их ETag и
+    закэшированные данные остались бы прежними после записи. Всё, что
+    полагается на версии, с таким кэшем отключается.
+    """
+    return not isinstance(
+        caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_BACKENDS
+    )
+
+
+def version_key(namespace, key=None):
+    if key is None:
+        return f'version:{namespace}'
+    return f'version:{namespace}:{key}'
+
+
+def get_version(namespace, key=None):
+    """
+    Возвращает текущую версию пространства имён кэша.
+
+    Начальная версия берётся из часов, а не с единицы: если счётчик
+    вытеснят из кэша, новая версия не совпадёт ни с одной из старых,
+    и устаревшие записи не оживут.
+    """
+    cache_key = version_key(namespace, key)
+    version = cache.get(cache_key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(cache_key, version, timeout=None):
+            version = cache.get(cache_key, version)
+    return version
+
+
+def get_versions(namespace, keys):
+    """Версии многих ключей пространства имён одним обращением к кэшу."""
+    cache_keys = {key: version_key(namespace, key) for key in keys}
+    found = cache.get_many(cache_keys.values())
+    return {
+        key: (
+            found[cache_key] if cache_key in found
+            else get_version(namespace, key)
+        )
+        for key, cache_key in cache_keys.items()
+    }
+
+
+def bump_version(namespace, key=None):
+    """Увеличивает версию, делая недействительными все записи под ней."""
+    cache_key = version_key(namespace, key)
+    try:
+        return cache.incr(cache_key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(cache_key, version, timeout=None)
+        return version
+
+
+class CachedResponseMixin:
+    """
+    Кэширует ответы list/retrieve для анонимных пользователей.
+
+    Ключ собирается из версий get_cache_versions(), пути и
+    отсортированных непустых параметров запроса. Версии поднимают
+    сигналы моделей, так что запись не нужно искать и удалять.
+    Аутентифицированные пользователи всегда получают свежие данные,
+    без общего кэша (shared_cache()) ответы не кэшируются.
+    """
+
+    cache_namespace = None
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    def get_cache_versions(self):
+        """Версии, от которых зависит ответ; None - не кэшировать."""
+        return [get_version(self.cache_namespace)]
+
+    def get_response_cache_key(self, request, versions):
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+            if value
+        )
+        # Параметры (например, длинный ?ids=) сворачиваются в хеш, чтобы
+        # ключ укладывался в ограничение memcached на 250 символов.
+        query = hashlib.md5(urlencode(params).encode('utf-8')).hexdigest()
+        return ':'.join((
+            'response',
+            self.cache_namespace,
+            *(str(version) for version in versions),
+            request.get_host(),
+            request.path,
+            query,
+            request.accepted_renderer.format,
+        ))
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated or not shared_cache():
+            return handler(request, *args, **kwargs)
+        versions = self.get_cache_versions()
+        if versions is None:
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request, versions)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.cache_timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ETagMixin:
+    """
+    Отдаёт сильный ETag для list/retrieve и 304 на совпавший If-None-Match.
+
+    ETag считается из версий кэша, пути, параметров запроса и формата
+    ответа, поэтому проверка не требует ни запросов к БД, ни
+    сериализации. Версии перечислены в etag_namespaces, для отдельного
+    объекта их можно уточнить в get_etag_versions(). Миксин оборачивает
+    только list: retrieve есть не у всех вьюсетов, поэтому вьюсет
+    с детальным просмотром сам передаёт его в conditional_response().
+    Без общего кэша (shared_cache()) ETag не отдаётся.
+    """
+
+    etag_namespaces = ()
+
+    def get_etag_versions(self):
+        return [get_version(namespace) for namespace in self.etag_namespaces]
+
+    def get_etag(self, request):
+        if not shared_cache():
+            return None
+        versions = self.get_etag_versions()
+        if versions is None:
+            return None
+        parts = [str(version) for version in versions] + [
+            request.get_host(),
+            request.get_full_path(),
+            request.accepted_renderer.format,
+        ]
+        digest = hashlib.md5(':'.join(parts).encode('utf-8')).hexdigest()
+        return f'"{digest}"'
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}
+            )
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
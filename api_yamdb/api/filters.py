@@ -1,6 +1,15 @@
+import string
+
 import django_filters
+from django.db import connection
+from django.db.models import Count, F
+from rest_framework.filters import SearchFilter
 
-from reviews.models import Title
+from api.indexes import genre_catalog, genre_index
+from reviews.constants import (FACET_YEAR_BUCKET, GENRE_INDEX_MAX_IDS,
+                               MAX_SCORE_VALUE, MIN_SCORE_VALUE)
+from reviews.models import GenreTitle, Title
+from reviews.search import search_titles
 
 
 class TitleFilter(django_filters.FilterSet):
@@ -13,20 +22,41 @@ class TitleFilter(django_filters.FilterSet):
     Атрибуты
     --------
         name : Фильтр по названию, ищет подстроку в поле name.
-        genre : Фильтр по жанру, ищет по slug жанра.
+        search : Полнотекстовый поиск по названию и описанию,
+            результаты упорядочены по релевантности.
+        genre : Фильтр по жанрам, slug через запятую.
+        genre_mode : all - произведения со всеми жанрами (по умолчанию),
+            any - хотя бы с одним из жанров.
         category : Фильтр по категории, ищет по slug категории.
+        year_min, year_max : Диапазон годов выпуска, границы включаются.
+        rating_min, rating_max : Диапазон рейтинга, границы включаются.
+            Сравнивается хранимый дробный рейтинг (Title.rating), а не
+            Avg() по отзывам, поэтому работает индекс по rating.
     """
 
     name = django_filters.CharFilter(
         field_name='name',
         lookup_expr='icontains'
     )
-    genre = django_filters.CharFilter(
-        field_name='genre__slug',
+    search = django_filters.CharFilter(method='filter_search')
+    genre = django_filters.CharFilter(method='filter_genre')
+    genre_mode = django_filters.ChoiceFilter(
+        choices=(('all', 'all'), ('any', 'any')),
+        method='filter_genre_mode',
     )
     category = django_filters.CharFilter(
         field_name='category__slug',
     )
+    year_min = django_filters.NumberFilter(
+        field_name='year',
+        lookup_expr='gte'
+    )
+    year_max = django_filters.NumberFilter(
+        field_name='year',
+        lookup_expr='lte'
+    )
+    rating_min = django_filters.NumberFilter(method='filter_rating_min')
+    rating_max = django_filters.NumberFilter(method='filter_rating_max')
 
     class Meta:
         """
@@ -40,3 +70,114 @@ class TitleFilter(django_filters.FilterSet):
 
         model = Title
         fields = ('name', 'year', 'category', 'genre')
+
+    def filter_search(self, queryset, name, value):
+        return search_titles(queryset, value)
+
+    def filter_genre(self, queryset, name, value):
+        """
+        Отбирает произведения по нескольким жанрам через обратный индекс.
+
+        Пересечение или объединение считается в памяти. Если индекс
+        отстал от БД или id слишком много для одного IN (...), тот же
+        отбор делается подзапросом.
+        """
+        slugs = {slug for slug in value.split(',') if slug}
+        match_all = self.form.cleaned_data.get('genre_mode') != 'any'
+        genre_ids = genre_catalog.ids(slugs)
+        if not genre_ids or (match_all and len(genre_ids) < len(slugs)):
+            return queryset.none()
+        title_ids = genre_index.titles(genre_ids, match_all)
+        if title_ids is not None and len(title_ids) <= GENRE_INDEX_MAX_IDS:
+            return queryset.filter(pk__in=title_ids)
+        matched = GenreTitle.objects.filter(
+            genre_id__in=genre_ids
+        ).order_by().values('title_id')
+        if match_all:
+            matched = matched.annotate(
+                genres=Count('genre_id')
+            ).filter(genres=len(genre_ids))
+        return queryset.filter(pk__in=matched.values('title_id'))
+
+    def filter_genre_mode(self, queryset, name, value):
+        return queryset
+
+    # Открытый диапазон SQLite без статистики распределения оценивает
+    # как четверть таблицы и предпочитает ему обход индекса сортировки.
+    # Рейтинг не выходит за пределы шкалы оценок, поэтому вторая
+    # граница ничего не отсекает, но делает поиск по индексу rating
+    # дешевле в оценке планировщика.
+
+    def filter_rating_min(self, queryset, name, value):
+        return queryset.filter(rating__range=(value, MAX_SCORE_VALUE))
+
+    def filter_rating_max(self, queryset, name, value):
+        return queryset.filter(rating__range=(MIN_SCORE_VALUE, value))
+
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class CatalogSearchFilter(SearchFilter):
+    """
+    SearchFilter, который ищет и по снимку справочника - списку словарей.
+
+    Как и в БД, каждое слово ?search= должно входить в одно из
+    search_fields без учёта регистра; префиксы полей (^, =, @, $) не
+    поддерживаются. LIKE в SQLite не учитывает регистр только у
+    латиницы, поэтому и в памяти без учёта регистра сравнивается только
+    она.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not isinstance(queryset, list):
+            return super().filter_queryset(request, queryset, view)
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+        if connection.vendor == 'sqlite':
+            def fold(value):
+                return value.translate(ASCII_LOWER)
+        else:
+            fold = str.lower
+        terms = [fold(term) for term in search_terms]
+        return [
+            row for row in queryset
+            if all(
+                any(term in fold(row[field]) for field in search_fields)
+                for term in terms
+            )
+        ]
+
+
+def title_facets(queryset):
+    """
+    Считает произведения выборки по жанрам, категориям и годам.
+
+    Три группирующих запроса, выборка подставляется в них подзапросом.
+    Годы сгруппированы интервалами по FACET_YEAR_BUCKET лет, ключ
+    интервала - «первый год-последний год».
+    """
+    queryset = queryset.order_by()
+    genres = GenreTitle.objects.filter(
+        title__in=queryset.values('pk')
+    ).values_list('genre__slug').annotate(
+        count=Count('title_id')
+    ).order_by('genre__slug')
+    categories = queryset.filter(
+        category__isnull=False
+    ).values_list('category__slug').annotate(
+        count=Count('pk')
+    ).order_by('category__slug')
+    years = queryset.annotate(
+        bucket=F('year') / FACET_YEAR_BUCKET * FACET_YEAR_BUCKET
+    ).values_list('bucket').annotate(count=Count('pk')).order_by('bucket')
+    return {
+        'genre': dict(genres),
+        'category': dict(categories),
+        'year': {
+            f'{bucket}-{bucket + FACET_YEAR_BUCKET - 1}': count
+            for bucket, count in years
+        },
+    }
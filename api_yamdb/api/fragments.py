@@ -0,0 +1,184 @@
+import json
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.dispatch import Signal
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from api.cache import (CATEGORIES, GENRES, TITLES, WEIGHTED_RATINGS,
+                       get_version, get_versions, shared_cache)
+from api.serializers import sparse_field_names
+from reviews.constants import FRAGMENT_CACHE_TIMEOUT
+
+# Отправляется после каждой сборки ответа из фрагментов:
+# namespace, hits, misses, bytes_written.
+fragment_cache_used = Signal()
+
+
+class RawJSON:
+    """Уже закодированный JSON, который рендерер отдаёт без изменений."""
+
+    __slots__ = ('content',)
+
+    def __init__(self, content):
+        self.content = content
+
+
+class FragmentJSONRenderer(JSONRenderer):
+    """JSONRenderer, который пропускает RawJSON как есть."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, RawJSON):
+            return data.content
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class FragmentCache:
+    """
+    Кэш закодированного JSON отдельных объектов.
+
+    Ключ фрагмента включает версию объекта, версии пространств имён из
+    dependencies и набор полей, поэтому изменение объекта или связанных
+    справочников делает фрагмент недоступным без удаления. Счётчики
+    попаданий, промахов и записанных байт копятся в stats и рассылаются
+    сигналом fragment_cache_used.
+
+    Методы
+    ------
+    fragments(rows, signature, render) : Фрагменты строк в их порядке.
+    snapshot() : Счётчики и доля попаданий на текущий момент.
+    """
+
+    def __init__(self, namespace, dependencies=(),
+                 timeout=FRAGMENT_CACHE_TIMEOUT):
+        self.namespace = namespace
+        self.dependencies = dependencies
+        self.timeout = timeout
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def get_keys(self, ids, signature):
+        shared = ':'.join(
+            str(get_version(namespace)) for namespace in self.dependencies
+        )
+        versions = get_versions(self.namespace, ids)
+        return {
+            pk: f'fragment:{self.namespace}:{signature}:{shared}:'
+                f'{pk}:{versions[pk]}'
+            for pk in ids
+        }
+
+    def fragments(self, rows, signature, render):
+        """
+        Возвращает JSON-фрагменты строк выборки в том же порядке.
+
+        render(rows) вызывается только для промахов и должен вернуть
+        представления этих строк в том же порядке. Без общего кэша
+        (shared_cache()) кодируются все строки и ничего не сохраняется.
+        """
+        if not shared_cache():
+            renderer = JSONRenderer()
+            return [renderer.render(data) for data in render(rows)]
+        keys = self.get_keys([row['id'] for row in rows], signature)
+        found = cache.get_many(keys.values())
+        missing = [row for row in rows if keys[row['id']] not in found]
+        written = {}
+        if missing:
+            renderer = JSONRenderer()
+            written = {
+                keys[row['id']]: renderer.render(data)
+                for row, data in zip(missing, render(missing))
+            }
+            cache.set_many(written, self.timeout)
+            found.update(written)
+        self.record(len(rows) - len(missing), len(missing),
+                    sum(map(len, written.values())))
+        return [found[keys[row['id']]] for row in rows]
+
+    def record(self, hits, misses, bytes_written):
+        with self._lock:
+            self.stats.update(
+                hits=hits, misses=misses, bytes_written=bytes_written
+            )
+        fragment_cache_used.send(
+            sender=self.__class__, namespace=self.namespace, hits=hits,
+            misses=misses, bytes_written=bytes_written,
+        )
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_rate'] = stats.get('hits', 0) / lookups if lookups else None
+        return stats
+
+
+class FragmentListMixin:
+    """
+    Собирает JSON списка из закэшированных фрагментов объектов.
+
+    Строки страницы читаются через values_serializer_class, как
+    в ValuesListMixin, но в представление превращаются только промахи
+    кэша; ответ склеивается из байтов фрагментов и отдаётся
+    FragmentJSONRenderer без повторного кодирования.
+    """
+
+    values_serializer_class = None
+    fragment_cache = None
+    fragment_renderer_classes = (FragmentJSONRenderer, BrowsableAPIRenderer)
+
+    def get_renderers(self):
+        """Рендерер для склеенного JSON нужен только списку."""
+        if getattr(self, 'action', None) == 'list':
+            return [renderer() for renderer in self.fragment_renderer_classes]
+        return super().get_renderers()
+
+    def list(self, request, *args, **kwargs):
+        field_names = sparse_field_names(
+            request, self.get_serializer_class().Meta.fields
+        )
+        serializer = self.values_serializer_class(field_names)
+        queryset = serializer.values(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset if page is None else page)
+        results = b'[' + b','.join(self.fragment_cache.fragments(
+            rows, ','.join(field_names), serializer.represent
+        )) + b']'
+        if page is not None:
+            results = self.render_envelope(
+                self.get_paginated_response([]).data, results
+            )
+        if not isinstance(request.accepted_renderer, FragmentJSONRenderer):
+            # Остальные рендереры (HTML-интерфейс DRF) кодируют данные
+            # сами и RawJSON не понимают.
+            return Response(json.loads(results))
+        return Response(RawJSON(results))
+
+    @staticmethod
+    def render_envelope(data, results):
+        """
+        Кодирует ответ пагинатора по его полям, подставляя вместо
+        пустого results готовые байты списка.
+        """
+        def encode(value):
+            return json.dumps(
+                value, cls=encoders.JSONEncoder, ensure_ascii=False,
+                separators=(',', ':'),
+            ).encode('utf-8')
+
+        return b'{' + b','.join(
+            encode(key) + b':' + (
+                results if key == 'results' else encode(value)
+            )
+            for key, value in data.items()
+        ) + b'}'
+
+
+title_fragments = FragmentCache(
+    TITLES, dependencies=(GENRES, CATEGORIES, WEIGHTED_RATINGS)
+)
@@ -0,0 +1,294 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connection, connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from api.cache import (CATEGORIES, GENRE_LINKS, GENRES, TITLE_NAMES,
+                       get_version, shared_cache)
+from reviews.constants import MEMORY_INDEX_MAX_AGE
+from reviews.models import Category, Genre, GenreTitle, Title
+from reviews.search import TITLE_FTS_TABLE
+
+
+def run_in_background(func):
+    """Выполняет func в фоновом потоке и закрывает его соединения с БД."""
+    def target():
+        try:
+            func()
+        finally:
+            connections.close_all()
+    threading.Thread(target=target, daemon=True).start()
+
+
+class MemoryIndex:
+    """
+    Базовый класс для индексов в памяти процесса.
+
+    Индекс запоминает версии пространств имён кэша из namespaces,
+    прочитанные перед сборкой. Пока они совпадают с текущими, индекс
+    отражает БД. После записи - своей или другого воркера - версии
+    расходятся: current() возвращает None, вызывающий код идёт в БД,
+    а индекс пересобирается в фоновом потоке, не в запросе. Если
+    задан max_age, индекс старше него тоже пересобирается в фоне, но
+    до конца сборки продолжает отвечать. Без общего кэша
+    (shared_cache()) версии других воркеров не видны, и индекс не
+    используется.
+
+    Методы
+    ------
+    build() : Строит данные индекса из БД.
+    current() : Данные индекса или None, если он отстал от БД.
+    refresh() : Перестраивает индекс в текущем потоке.
+    reset() : Сбрасывает индекс.
+    """
+
+    namespaces = ()
+    max_age = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._versions = None
+        self._built_at = None
+        self._building = False
+
+    def build(self):
+        raise NotImplementedError
+
+    def get_versions(self):
+        return [get_version(namespace) for namespace in self.namespaces]
+
+    def current(self):
+        if not shared_cache():
+            return None
+        versions = self.get_versions()
+        if self._versions != versions:
+            self.schedule_refresh()
+        elif (self.max_age is not None
+              and time.monotonic() - self._built_at >= self.max_age):
+            self.schedule_refresh()
+        with self._lock:
+            return self._data if self._versions == versions else None
+
+    def refresh(self):
+        # Версии читаются до сборки: запись, зафиксированная во время
+        # неё, поднимет их, и индекс будет пересобран ещё раз.
+        versions = self.get_versions()
+        data = self.build()
+        with self._lock:
+            self._data, self._versions = data, versions
+            self._built_at = time.monotonic()
+
+    def schedule_refresh(self):
+        """Запускает фоновую сборку, если она ещё не идёт."""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+
+        def rebuild():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._building = False
+        run_in_background(rebuild)
+
+    def reset(self):
+        with self._lock:
+            self._data = self._versions = self._built_at = None
+            self._building = False
+
+
+class GenreIndex(MemoryIndex):
+    """Обратный индекс: id жанра -> отсортированный список id произведений."""
+
+    namespaces = (GENRE_LINKS,)
+
+    def build(self):
+        index = {}
+        rows = GenreTitle.objects.order_by(
+            'genre_id', 'title_id'
+        ).values_list('genre_id', 'title_id')
+        for genre_id, title_id in rows.iterator():
+            index.setdefault(genre_id, []).append(title_id)
+        return index
+
+    def titles(self, genre_ids, match_all=True):
+        """
+        Возвращает id произведений со всеми (или любым) из жанров или
+        None, если индекс отстал от БД.
+        """
+        index = self.current()
+        if index is None:
+            return None
+        postings = sorted(
+            (index.get(genre_id, ()) for genre_id in genre_ids), key=len
+        )
+        if not postings:
+            return []
+        if match_all:
+            result = set(postings[0])
+            for posting in postings[1:]:
+                result.intersection_update(posting)
+        else:
+            result = set().union(*postings)
+        return sorted(result)
+
+
+def normalize_name(name):
+    """Приводит название к виду для сравнения: регистр, пробелы, ё."""
+    return ' '.join(name.casefold().replace('ё', 'е').split())
+
+
+def name_keys(name):
+    """Ключи названия: оно само и его хвосты с начала каждого слова."""
+    words = normalize_name(name).split(' ')
+    return [' '.join(words[start:]) for start in range(len(words))]
+
+
+def name_match_query(prefix):
+    """
+    Запрос FTS5 по названию, который находит все названия с ключом,
+    начинающимся с prefix, и, возможно, лишние.
+
+    FTS5 не приравнивает ё к е, поэтому каждое слово ищется по префиксу
+    до первой «е», а слово, которое с неё начинается, - по «е» или «ё».
+    """
+    terms = []
+    for word in re.findall(r'\w+', prefix):
+        head = word.split('е')[0]
+        terms.append(f'"{head}"*' if head else '("е"* OR "ё"*)')
+    return f'name : ({" ".join(terms)})' if terms else None
+
+
+class TitleNameIndex(MemoryIndex):
+    """
+    Отсортированный список ключей названий для поиска по префиксу.
+
+    keys - отсортированные пары (ключ, id произведения), titles -
+    id -> (название, рейтинг). Префикс ищется бинарным поиском,
+    из совпадений кучей выбираются limit лучших по хранимому рейтингу
+    без запросов к БД. Названия сверяются с версией TITLE_NAMES, её
+    поднимают сохранение и удаление произведений. Пересчёт рейтинга
+    по отзывам версию не поднимает: порядок подсказок догоняет его
+    при фоновой перестройке раз в max_age секунд. Пока индекс отстал,
+    подсказки с тем же порядком ищутся в БД.
+    """
+
+    namespaces = (TITLE_NAMES,)
+    max_age = MEMORY_INDEX_MAX_AGE
+
+    def build(self):
+        index = {'keys': [], 'titles': {}}
+        rows = Title.objects.order_by().values_list('id', 'name', 'rating')
+        for title_id, name, rating in rows.iterator():
+            index['titles'][title_id] = (name, rating)
+            index['keys'].extend((key, title_id) for key in name_keys(name))
+        index['keys'].sort()
+        return index
+
+    def complete(self, query, limit):
+        """Произведения, слово названия которых начинается с query."""
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        index = self.current()
+        if index is None:
+            return self.complete_from_db(prefix, limit)
+        keys, titles = index['keys'], index['titles']
+        matched = set()
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            matched.add(keys[position][1])
+            position += 1
+        ranked = heapq.nsmallest(
+            limit, matched,
+            key=lambda title_id: (
+                titles[title_id][1] is None,
+                -(titles[title_id][1] or 0),
+                titles[title_id][0],
+                title_id,
+            )
+        )
+        return [(title_id, *titles[title_id]) for title_id in ranked]
+
+    @staticmethod
+    def complete_from_db(prefix, limit):
+        """
+        Подсказки из БД: кандидаты по FTS5-индексу названий в порядке
+        рейтинга, ключи проверяются так же, как в индексе.
+        """
+        titles = Title.objects.order_by(
+            F('rating').desc(nulls_last=True), 'name', 'pk'
+        )
+        if connection.vendor == 'sqlite':
+            match = name_match_query(prefix)
+            if match is None:
+                return []
+            titles = titles.filter(pk__in=RawSQL(
+                f'SELECT rowid FROM {TITLE_FTS_TABLE} '
+                f'WHERE {TITLE_FTS_TABLE} MATCH %s',
+                (match,)
+            ))
+        result = []
+        for title_id, name, rating in titles.values_list(
+            'id', 'name', 'rating'
+        ).iterator():
+            if any(key.startswith(prefix) for key in name_keys(name)):
+                result.append((title_id, name, rating))
+                if len(result) == limit:
+                    break
+        return result
+
+
+class NameSlugCatalog(MemoryIndex):
+    """
+    Снимок небольшого справочника (жанры, категории) в памяти процесса.
+
+    Из него отдаются список и поиск справочника и slug -> id для
+    фильтра произведений по жанрам. Записи через вьюсеты поднимают
+    версию namespace в общем кэше, и снимок пересобирается во всех
+    воркерах. Пока он отстал, rows() возвращает None, а ids() читает БД.
+    """
+
+    def __init__(self, model, namespace):
+        super().__init__()
+        self.model = model
+        self.namespaces = (namespace,)
+
+    def build(self):
+        rows = list(self.model.objects.values('id', 'name', 'slug'))
+        return {
+            'rows': rows,
+            'by_slug': {row['slug']: row for row in rows},
+        }
+
+    def rows(self):
+        """Записи в порядке модели или None, если снимок отстал от БД."""
+        catalog = self.current()
+        return None if catalog is None else catalog['rows']
+
+    def ids(self, slugs):
+        """id записей по slug; неизвестные slug пропускаются."""
+        catalog = self.current()
+        if catalog is None:
+            return list(self.model.objects.filter(
+                slug__in=slugs
+            ).values_list('id', flat=True))
+        by_slug = catalog['by_slug']
+        return [by_slug[slug]['id'] for slug in slugs if slug in by_slug]
+
+
+genre_index = GenreIndex()
+genre_catalog = NameSlugCatalog(Genre, GENRES)
+category_catalog = NameSlugCatalog(Category, CATEGORIES)
+title_name_index = TitleNameIndex()
+MEMORY_INDEXES = (
+    genre_index, genre_catalog, category_catalog, title_name_index
+)
@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from api.fast_serializers import (CommentValuesSerializer,
+                                  ReviewValuesSerializer,
+                                  TitleValuesSerializer)
+from api.serializers import (CommentSerializer, ReviewSerializer,
+                             TitleReadOnlySerializer)
+from reviews.models import Comment, Genre, Review, Title
+
+BENCHMARKS = (
+    (
+        'titles',
+        Title.objects.select_related('category').prefetch_related(
+            Prefetch('genre', queryset=Genre.objects.all())
+        ).order_by('rating'),
+        TitleReadOnlySerializer,
+        TitleValuesSerializer,
+    ),
+    (
+        'reviews',
+        Review.objects.select_related('author'),
+        ReviewSerializer,
+        ReviewValuesSerializer,
+    ),
+    (
+        'comments',
+        Comment.objects.select_related('author'),
+        CommentSerializer,
+        CommentValuesSerializer,
+    ),
+)
+
+
+class Command(BaseCommand):
+    """Сравнивает сериализаторы DRF и быструю сериализацию из values()."""
+
+    help = ('Benchmark DRF serializers against the values() fast path '
+            'on list pages of the current database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=200)
+        parser.add_argument('--page-size', type=int,
+                            default=api_settings.PAGE_SIZE)
+
+    def measure(self, render, pages):
+        started = time.perf_counter()
+        for _ in range(pages):
+            body = render()
+        return pages / (time.perf_counter() - started), body
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        pages, page_size = options['pages'], options['page_size']
+        for name, queryset, serializer_class, fast_class in BENCHMARKS:
+            fast = fast_class(serializer_class.Meta.fields)
+            page = queryset[:page_size]
+            drf_rate, drf_body = self.measure(
+                lambda: renderer.render(
+                    serializer_class(page.all(), many=True).data
+                ),
+                pages
+            )
+            fast_rate, fast_body = self.measure(
+                lambda: renderer.render(
+                    fast.represent(fast.values(page.all()))
+                ),
+                pages
+            )
+            if drf_body != fast_body:
+                raise CommandError(
+                    f'{name}: быстрая сериализация не совпадает с DRF.'
+                )
+            self.stdout.write(
+                f'{name}: DRF {drf_rate:.0f} стр/с, '
+                f'values() {fast_rate:.0f} стр/с, '
+                f'x{fast_rate / drf_rate:.1f}'
+            )
@@ -0,0 +1,294 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from reviews.constants import EXACT_COUNT_THRESHOLD, TITLE_CURSOR_ORDERINGS
+
+
+def table_row_estimate(model, using='default'):
+    """
+    Количество строк таблицы по статистике БД или None.
+
+    SQLite хранит его в sqlite_stat1 после ANALYZE, PostgreSQL -
+    в pg_class.reltuples после VACUUM/ANALYZE.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (table,))
+            row = cursor.fetchone()
+    except DatabaseError:
+        # Например, ANALYZE ещё не запускался и sqlite_stat1 нет.
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedPage(Page):
+    """Страница, которая знает о следующей по прочитанной лишней строке."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator, который не считает COUNT(*) по всей выборке.
+
+    Какие страницы есть, решает не count: страница читается с одной
+    лишней строкой, по ней видно, есть ли следующая, а пустая страница
+    после первой - 404. count только сообщается клиенту. На последней
+    странице он точный (смещение плюс прочитанные строки), иначе
+    сначала считается ограниченный COUNT по первым threshold + 1
+    строкам: если строк не больше порога, это точное количество,
+    иначе берётся оценка estimate(), но не меньше уже прочитанного;
+    если оценки нет, считается точно.
+    """
+
+    def __init__(self, *args, threshold, estimate, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.estimate = estimate
+        self.count_estimated = False
+        self.rows_seen = 0
+        self.exhausted = False
+
+    def validate_number(self, number):
+        """Проверяет только нижнюю границу, верхнюю - page() по строкам."""
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым.')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1.')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows and number > 1:
+            raise EmptyPage('На этой странице нет результатов.')
+        self.rows_seen = bottom + len(rows) + has_next
+        self.exhausted = not has_next
+        return EstimatedPage(rows, number, self, has_next)
+
+    @cached_property
+    def count(self):
+        if self.exhausted:
+            return self.rows_seen
+        if not hasattr(self.object_list, 'query'):
+            return len(self.object_list)
+        bounded = self.object_list[:self.threshold + 1].count()
+        if bounded <= self.threshold:
+            return bounded
+        estimate = self.estimate(self.object_list)
+        if estimate is None:
+            return self.object_list.count()
+        self.count_estimated = True
+        return max(estimate, bounded, self.rows_seen)
+
+    def last_page_number(self):
+        """
+        Номер последней страницы по точному количеству строк.
+
+        Для ?page=last оценка не годится: заниженная дала бы 404,
+        завышенная - пустую страницу. Точное количество запоминается
+        как count ответа.
+        """
+        if hasattr(self.object_list, 'query'):
+            self.__dict__['count'] = self.object_list.count()
+        else:
+            self.__dict__['count'] = len(self.object_list)
+        return self.num_pages
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с приблизительным count для больших выборок.
+
+    Ниже EXACT_COUNT_THRESHOLD и на последней странице count точный.
+    Выше - из счётчика, который ведёт вьюсет (get_estimated_count
+    (queryset)), или, для выборки без фильтров, из статистики таблицы;
+    без них (например, у комментариев) - точный COUNT. Ключ
+    count_estimated показывает, что count приблизительный; ссылки
+    next/previous и доступность страниц от него не зависят, а
+    ?page=last считается по точному COUNT.
+    """
+
+    count_threshold = EXACT_COUNT_THRESHOLD
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        return EstimatedCountPaginator(
+            object_list, per_page,
+            threshold=self.count_threshold, estimate=self.estimate_count,
+        )
+
+    def get_page_number(self, request, paginator):
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            return paginator.last_page_number()
+        return page_number
+
+    def estimate_count(self, queryset):
+        estimator = getattr(self.view, 'get_estimated_count', None)
+        if estimator is not None:
+            estimate = estimator(queryset)
+            if estimate is not None:
+                return estimate
+        if queryset.query.where:
+            return None
+        return table_row_estimate(queryset.model, queryset.db)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_estimated': self.page.paginator.count_estimated,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_estimated'] = {
+            'type': 'boolean',
+        }
+        return response_schema
+
+
+class TitleCursorPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация произведений.
+
+    Страница выбирается условием по паре (поле сортировки, id) от
+    последней записи предыдущей страницы, поэтому не нужны ни COUNT(*),
+    ни OFFSET, и любая страница стоит столько же, сколько первая.
+    Курсор хранит значение поля и id последней записи в base64-JSON.
+
+    Атрибуты
+    --------
+        page_size : Количество произведений на странице.
+        cursor_query_param : Параметр запроса с курсором.
+        ordering_query_param : Параметр запроса с сортировкой.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = request.query_params.get(
+            self.ordering_query_param, TITLE_CURSOR_ORDERINGS[0]
+        )
+        if self.ordering not in TITLE_CURSOR_ORDERINGS:
+            self.ordering = TITLE_CURSOR_ORDERINGS[0]
+        self.descending = self.ordering.startswith('-')
+        self.field = self.ordering.lstrip('-')
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.after(*cursor))
+        if self.descending:
+            order = (F(self.field).desc(nulls_last=True), '-pk')
+        else:
+            order = (F(self.field).asc(nulls_first=True), 'pk')
+        page = list(queryset.order_by(*order)[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def after(self, value, pk):
+        """Условие «строго после (value, pk)» с учётом NULL-значений."""
+        lookup = 'lt' if self.descending else 'gt'
+        same_value = (
+            Q(**{f'{self.field}__isnull': True}) if value is None
+            else Q(**{self.field: value})
+        )
+        condition = same_value & Q(**{f'pk__{lookup}': pk})
+        if value is None:
+            if not self.descending:
+                condition |= Q(**{f'{self.field}__isnull': False})
+            return condition
+        condition |= Q(**{f'{self.field}__{lookup}': value})
+        if self.descending:
+            condition |= Q(**{f'{self.field}__isnull': True})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            value, pk = cursor['value'], int(cursor['pk'])
+        except (BinasciiError, KeyError, TypeError, ValueError,
+                UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(value, (str, int, float, type(None))):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def encode_cursor(self, obj):
+        if isinstance(obj, dict):
+            cursor = {'value': obj[self.field], 'pk': obj['id']}
+        else:
+            cursor = {'value': getattr(obj, self.field), 'pk': obj.pk}
+        encoded = urlsafe_b64encode(
+            json.dumps(cursor, ensure_ascii=False).encode('utf-8')
+        ).decode('ascii')
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.ordering_query_param,
+                                  self.ordering)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -1,12 +1,22 @@
-from rest_framework import serializers
+from rest_framework import permissions, serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 from django.contrib.auth.tokens import default_token_generator as dtg
 from django.core.exceptions import ValidationError
+from django.db import connection, router, transaction
+from django.db.models.signals import m2m_changed, post_save
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
+from api.fast_serializers import ReviewValuesSerializer
 from api.validators import validate_data
-from reviews.models import Category, Comment, Genre, Review, Title
+from reviews.histograms import score_histograms
+from reviews.models import (Category, Comment, Genre, GenreTitle, Review,
+                            Title)
 from reviews.constants import (EMAIL_MAX_LENGTH,
+                               TITLE_BULK_MAX_SIZE,
                                USERNAME_MAX_LENGTH,
                                CONFIRMATION_CODE_MAX_LENGTH)
 from users.models import User
@@ -15,6 +25,42 @@ from reviews.constants import (
 )
 
 
+def sparse_field_names(request, field_names):
+    """
+    Отбирает поля ответа по параметрам ?fields= и ?omit=.
+
+    Оба параметра - имена полей через запятую. Без ?fields= остаются
+    все поля, неизвестные имена игнорируются. Для запросов на запись
+    поля не отбираются.
+    """
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return list(field_names)
+    fields = {
+        name for name in request.query_params.get('fields', '').split(',')
+        if name
+    }
+    omit = set(request.query_params.get('omit', '').split(','))
+    return [
+        name for name in field_names
+        if (not fields or name in fields) and name not in omit
+    ]
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля, отобранные sparse_field_names()."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent
+        if isinstance(root, serializers.ListSerializer):
+            root = root.parent
+        if root is not None:
+            # Вложенные сериализаторы отдаются целиком.
+            return fields
+        names = sparse_field_names(self.context.get('request'), fields)
+        return {name: fields[name] for name in names}
+
+
 class SignUpSerializer(serializers.Serializer):
     """Проверка уникальности email и username."""
 
@@ -96,7 +142,8 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ('name', 'slug')
 
 
-class TitleReadOnlySerializer(serializers.ModelSerializer):
+class TitleReadOnlySerializer(SparseFieldsMixin,
+                              serializers.ModelSerializer):
     """Класс-сериализатор для произведений: метод get."""
 
     genre = GenreSerializer(many=True, read_only=True)
@@ -105,14 +152,169 @@ class TitleReadOnlySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Title
-        fields = ('id', 'name', 'year', 'rating',
+        fields = ('id', 'name', 'year', 'rating', 'weighted_rating',
                   'description', 'genre', 'category')
 
+    def to_representation(self, instance):
+        """
+        Добавляет к произведению запрошенные в контексте вложения.
+
+        histogram - распределение оценок; include - набор из reviews
+        (первая страница отзывов) и counts (число отзывов и комментариев).
+        Каждое вложение стоит одного запроса к БД.
+        """
+        data = super().to_representation(instance)
+        if self.context.get('histogram'):
+            data['histogram'] = score_histograms([instance.pk])[instance.pk]
+        include = self.context.get('include', ())
+        if 'reviews' in include:
+            data['reviews'] = title_reviews_page(
+                instance, self.context.get('request')
+            )
+        if 'counts' in include:
+            data['counts'] = {
+                'reviews': instance.rating_count,
+                'comments': Comment.objects.filter(
+                    review__title_id=instance.pk
+                ).count(),
+            }
+        return data
+
+
+def title_reviews_page(title, request):
+    """
+    Первая страница отзывов произведения в формате /titles/<id>/reviews/.
+
+    Строки читаются одним запросом через .values(), количество берётся
+    из счётчика отзывов произведения, без COUNT(*).
+    """
+    page_size = api_settings.PAGE_SIZE
+    serializer = ReviewValuesSerializer(ReviewSerializer.Meta.fields)
+    rows = serializer.values(title.reviews.all())[:page_size]
+    next_link = None
+    if title.rating_count > page_size and request is not None:
+        next_link = replace_query_param(
+            request.build_absolute_uri(
+                reverse('reviews-list', kwargs={'title_id': title.pk})
+            ),
+            'page', 2
+        )
+    return {
+        'count': title.rating_count,
+        'count_estimated': False,
+        'next': next_link,
+        'previous': None,
+        'results': serializer.represent(rows),
+    }
+
+
+def to_slug(value):
+    """Приводит входное значение к строке slug, как CharField."""
+    return serializers.CharField().to_internal_value(value)
+
+
+class SlugManyRelatedField(serializers.ManyRelatedField):
+    """Список slug, который разрешается одним запросом slug__in."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        slugs = list(dict.fromkeys(to_slug(slug) for slug in data))
+        objects = child.get_objects(slugs)
+        for slug in slugs:
+            if slug not in objects:
+                child.fail('does_not_exist', slug_name=child.slug_field,
+                           value=slug)
+        return [objects[slug] for slug in slugs]
+
+
+class BulkSlugRelatedField(serializers.SlugRelatedField):
+    """
+    SlugRelatedField, у которого many=True разрешает slug пачкой.
+
+    prefetch() заранее загружает объекты для пакета сериализаторов:
+    пока он действует, поле и его список берут объекты из него
+    без запросов к БД.
+    """
+
+    prefetched = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return SlugManyRelatedField(**list_kwargs)
+
+    def get_objects(self, slugs):
+        """Объекты по slug: из prefetch() или одним запросом slug__in."""
+        if self.prefetched is not None:
+            return {
+                slug: self.prefetched[slug]
+                for slug in slugs if slug in self.prefetched
+            }
+        return {
+            getattr(obj, self.slug_field): obj
+            for obj in self.get_queryset().filter(
+                **{f'{self.slug_field}__in': slugs}
+            )
+        }
+
+    def prefetch(self, values):
+        """Загружает объекты для всех values; некорректные пропускаются."""
+        slugs = set()
+        for value in values:
+            try:
+                slugs.add(to_slug(value))
+            except serializers.ValidationError:
+                continue
+        # Объекты берутся из БД, а не из прошлой выборки.
+        self.prefetched = None
+        self.prefetched = self.get_objects(slugs)
+
+    def to_internal_value(self, data):
+        if self.prefetched is None:
+            return super().to_internal_value(data)
+        slug = to_slug(data)
+        if slug not in self.prefetched:
+            self.fail('does_not_exist', slug_name=self.slug_field,
+                      value=slug)
+        return self.prefetched[slug]
+
+
+def set_title_genres(title, genres, created=False):
+    """
+    Приводит жанры произведения к списку genres разницей связей.
+
+    Удаляются только лишние строки GenreTitle, добавляются только новые,
+    одним bulk_create. Удаление рассылает post_delete по строкам,
+    для вставки m2m_changed отправляется вручную.
+    """
+    genre_ids = {genre.pk for genre in genres}
+    current = set() if created else set(
+        GenreTitle.objects.filter(title=title).values_list(
+            'genre_id', flat=True
+        )
+    )
+    removed = current - genre_ids
+    added = genre_ids - current
+    if removed:
+        GenreTitle.objects.filter(title=title, genre_id__in=removed).delete()
+    if added:
+        GenreTitle.objects.bulk_create(
+            GenreTitle(title=title, genre_id=genre_id) for genre_id in added
+        )
+        send_title_genres_changed(title, 'post_add', added)
+
 
 class TitleSerializer(serializers.ModelSerializer):
     """Класс-сериализатор для произведений: методы кроме get."""
 
-    genre = serializers.SlugRelatedField(
+    genre = BulkSlugRelatedField(
         slug_field='slug',
         queryset=Genre.objects.all(),
         many=True,
@@ -129,11 +331,128 @@ class TitleSerializer(serializers.ModelSerializer):
         model = Title
         fields = ('id', 'name', 'year', 'description', 'genre', 'category')
 
+    def create(self, validated_data):
+        genres = validated_data.pop('genre')
+        with transaction.atomic():
+            title = super().create(validated_data)
+            set_title_genres(title, genres, created=True)
+        return title
+
+    def update(self, instance, validated_data):
+        genres = validated_data.pop('genre', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if genres is not None:
+                set_title_genres(instance, genres)
+        return instance
+
     def to_representation(self, instance):
         return TitleReadOnlySerializer(instance).data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+def send_title_genres_changed(title, action, genre_ids):
+    """
+    Рассылает m2m_changed для связей, записанных в обход менеджера.
+
+    bulk_create по GenreTitle сигналов не отправляет, а на m2m_changed
+    подписаны кэш произведений и индекс жанров.
+    """
+    m2m_changed.send(
+        sender=Title.genre.through, instance=title, action=action,
+        reverse=False, model=Genre, pk_set=set(genre_ids),
+        using=router.db_for_write(Title)
+    )
+
+
+class TitleBulkListSerializer(serializers.ListSerializer):
+    """
+    Пакетное создание произведений.
+
+    Все slug жанров и категорий разрешаются одним запросом на таблицу
+    через prefetch() полей элемента. Связи с жанрами вставляются одним
+    bulk_create, произведения - тоже, если бэкенд возвращает id из
+    bulk_create. Всё в одной транзакции.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > TITLE_BULK_MAX_SIZE:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f'Не больше {TITLE_BULK_MAX_SIZE} произведений '
+                    'за запрос.'
+                ]
+            })
+        items = [
+            item for item in (data if isinstance(data, list) else ())
+            if isinstance(item, dict)
+        ]
+        genre_slugs = [
+            slug for item in items
+            if isinstance(item.get('genre'), list)
+            for slug in item['genre']
+        ]
+        fields = self.child.fields
+        genre = fields['genre'].child_relation
+        category = fields['category']
+        genre.prefetch(genre_slugs)
+        category.prefetch(item.get('category') for item in items)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            genre.prefetched = category.prefetched = None
+
+    def create(self, validated_data):
+        genre_ids = [
+            [genre.pk for genre in item.pop('genre')]
+            for item in validated_data
+        ]
+        titles = [Title(**item) for item in validated_data]
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Title.objects.bulk_create(titles)
+                for title in titles:
+                    post_save.send(
+                        sender=Title, instance=title, created=True,
+                        update_fields=None, raw=False,
+                        using=router.db_for_write(Title)
+                    )
+            else:
+                # Бэкенд не возвращает id из bulk_create (SQLite в
+                # Django 3.2): вставляем по одной строке в той же
+                # транзакции, без отдельного HTTP-запроса на каждую.
+                for title in titles:
+                    title.save()
+            GenreTitle.objects.bulk_create(
+                GenreTitle(title=title, genre_id=genre_id)
+                for title, ids in zip(titles, genre_ids)
+                for genre_id in ids
+            )
+            for title, ids in zip(titles, genre_ids):
+                send_title_genres_changed(title, 'post_add', ids)
+        return titles
+
+
+class TitleBulkSerializer(serializers.ModelSerializer):
+    """Элемент пакета произведений: жанры и категория передаются slug."""
+
+    genre = BulkSlugRelatedField(
+        slug_field='slug',
+        queryset=Genre.objects.all(),
+        many=True,
+        allow_empty=False
+    )
+    category = BulkSlugRelatedField(
+        slug_field='slug',
+        queryset=Category.objects.all()
+    )
+
+    class Meta:
+        model = Title
+        fields = ('name', 'year', 'description', 'genre', 'category')
+        list_serializer_class = TitleBulkListSerializer
+
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Класс-сериализатор для ревью."""
 
     author = serializers.SlugRelatedField(
@@ -167,7 +486,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Класс-сериализатор для комментариев."""
 
     author = serializers.SlugRelatedField(
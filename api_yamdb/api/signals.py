@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from api.cache import (CATEGORIES, GENRE_LINKS, GENRES, TITLE_NAMES, TITLES,
+                       bump_version)
+from reviews.models import (Category, Comment, Genre, GenreTitle, Review,
+                            Title)
+
+
+def invalidate(title_ids=(), namespaces=(), collection=True):
+    """
+    Поднимает версии кэша после фиксации транзакции.
+
+    Версия коллекции произведений поднимается, если изменение видно
+    в списках (collection), версии отдельных произведений и
+    пространств имён - по списку. Пространства имён поднимаются первыми:
+    запрос, увидевший новую версию коллекции, увидит и отставший индекс
+    в памяти и не закэширует под ней его старый ответ.
+    """
+    def bump():
+        for namespace in namespaces:
+            bump_version(namespace)
+        if collection:
+            bump_version(TITLES)
+        for title_id in title_ids:
+            bump_version(TITLES, title_id)
+    transaction.on_commit(bump)
+
+
+def title_changed(sender, instance, **kwargs):
+    invalidate(title_ids=[instance.pk], namespaces=[TITLE_NAMES])
+
+
+def title_relation_changed(sender, instance, **kwargs):
+    invalidate(title_ids=[instance.title_id])
+
+
+def genre_title_changed(sender, instance, **kwargs):
+    invalidate(title_ids=[instance.title_id], namespaces=[GENRE_LINKS])
+
+
+def comment_changed(sender, instance, **kwargs):
+    """
+    Комментарии видны только в ответе произведения (?include=counts),
+    поэтому списки не сбрасываются. Вьюсет комментариев сохраняет и
+    читает их вместе с отзывом, так что id произведения известен.
+    """
+    if Comment.review.is_cached(instance):
+        title_id = instance.review.title_id
+    else:
+        title_id = Review.objects.filter(
+            pk=instance.review_id
+        ).values_list('title_id', flat=True).first()
+    if title_id is not None:
+        invalidate(title_ids=[title_id], collection=False)
+
+
+def genre_changed(sender, instance, **kwargs):
+    invalidate(namespaces=[GENRES])
+
+
+def category_changed(sender, instance, **kwargs):
+    invalidate(namespaces=[CATEGORIES])
+
+
+def title_genres_invalidated(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate(title_ids=[instance.pk], namespaces=[GENRE_LINKS])
+    elif pk_set is not None:
+        invalidate(title_ids=pk_set, namespaces=[GENRE_LINKS])
+    else:
+        # У жанра сняты все произведения: их id неизвестны.
+        invalidate(namespaces=[GENRES, GENRE_LINKS])
+
+
+for model, receiver in (
+    (Title, title_changed),
+    (Review, title_relation_changed),
+    (GenreTitle, genre_title_changed),
+    (Comment, comment_changed),
+    (Genre, genre_changed),
+    (Category, category_changed),
+):
+    post_save.connect(receiver, sender=model)
+    post_delete.connect(receiver, sender=model)
+m2m_changed.connect(title_genres_invalidated, sender=Title.genre.through)
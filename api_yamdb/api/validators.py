@@ -1,13 +1,14 @@
 from datetime import datetime
 import re
 
-from django.db.models import Q
+from django.db.models import BigIntegerField, Q
 from django.core.exceptions import ValidationError
 from rest_framework import serializers
 
 from reviews.constants import (
     FORBIDDEN_USERNAME,
     MIN_YEAR,
+    TITLE_IDS_MAX_SIZE,
     USERNAME_REGEX,
 )
 from users.models import User
@@ -43,3 +44,39 @@ def real_year(value):
         raise ValidationError(
             'Укажите верный год.'
         )
+
+
+def parse_id_list(value, max_size=TITLE_IDS_MAX_SIZE):
+    """
+    Разбирает список id через запятую: без повторов, в исходном порядке.
+
+    Разбор прерывается, как только id набралось больше max_size, так
+    что длинная строка запроса не разбирается целиком.
+    """
+    ids, seen = [], set()
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        pk = None
+        if part.isascii() and part.isdigit():
+            try:
+                pk = int(part)
+            except ValueError:
+                # Слишком длинное число: int() отказывается его разбирать.
+                pass
+        if pk is None or pk > BigIntegerField.MAX_BIGINT:
+            raise serializers.ValidationError(
+                {'ids': f'Неверный id: {part[:20]}.'}
+            )
+        if pk in seen:
+            continue
+        seen.add(pk)
+        ids.append(pk)
+        if len(ids) > max_size:
+            raise serializers.ValidationError(
+                {'ids': f'Не больше {max_size} id за запрос.'}
+            )
+    if not ids:
+        raise serializers.ValidationError({'ids': 'Укажите id через запятую.'})
+    return ids
@@ -1,28 +1,48 @@
+import json
+from functools import partial
+
 from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator as dtg
 from django.core.mail import send_mail
-from django.db.models import Avg
+from django.db.models import Case, Subquery, When
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import (filters, generics, mixins, permissions, status,
                             viewsets)
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt.tokens import AccessToken
 
-from api.filters import TitleFilter
+from api.cache import (CATEGORIES, GENRES, TITLES, WEIGHTED_RATINGS,
+                       CachedResponseMixin, ETagMixin, get_version)
+from api.fast_serializers import (CommentValuesSerializer,
+                                  ReviewValuesSerializer,
+                                  TitleValuesSerializer)
+from api.filters import CatalogSearchFilter, TitleFilter, title_facets
+from api.fragments import FragmentListMixin, title_fragments
+from api.indexes import category_catalog, genre_catalog, title_name_index
+from api.pagination import EstimatedCountPagination, TitleCursorPagination
 from api.permissions import (
     IsAdminOrSuperuser,
     IsAuthorOrModeratorOrAdmin,
     IsAdminOrReadOnly)
 from api.serializers import (CategorySerializer, CommentSerializer,
                              GenreSerializer, ReviewSerializer,
-                             SignUpSerializer, TitleReadOnlySerializer,
-                             TitleSerializer, TokenSerializer, UserSerializer)
-from reviews.models import Category, Genre, Review, Title
+                             SignUpSerializer, TitleBulkSerializer,
+                             TitleReadOnlySerializer,
+                             TitleSerializer, TokenSerializer, UserSerializer,
+                             sparse_field_names)
+from api.validators import parse_id_list
+from reviews.constants import (AUTOCOMPLETE_LIMIT, CURSOR_PAGINATION,
+                               EXPORT_CHUNK_SIZE, TITLE_IDS_BATCH_MAX_SIZE,
+                               TITLE_INCLUDES)
+from reviews.histograms import score_histograms
+from reviews.models import (Category, Genre, Leaderboard, Review,
+                            SimilarTitle, Title)
 from users.models import User
 
 
@@ -140,7 +160,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    pagination_class = PageNumberPagination
+    pagination_class = EstimatedCountPagination
     permission_classes = (IsAdminOrSuperuser,)
     filter_backends = (SearchFilter,)
     search_fields = ('username',)
@@ -165,16 +185,95 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class NameSlugModelViewSet(mixins.CreateModelMixin,
+class SparseQuerysetMixin:
+    """
+    Подгоняет выборку под поля ответа из ?fields= и ?omit=.
+
+    JOIN, prefetch и колонки подключаются только для полей, которые
+    попадут в ответ, так что урезанный запрос дешевле и для БД.
+
+    Атрибуты
+    --------
+    select_related_fields : Поле ответа -> связь для select_related.
+    prefetch_related_fields : Поле ответа -> связь для prefetch_related.
+    deferred_fields : Колонки, которые не читаются без своего поля.
+    """
+
+    select_related_fields = {}
+    prefetch_related_fields = {}
+    deferred_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = sparse_field_names(
+            self.request, self.get_serializer_class().Meta.fields
+        )
+        select = [
+            lookup for field, lookup in self.select_related_fields.items()
+            if field in fields
+        ]
+        prefetch = [
+            lookup for field, lookup in self.prefetch_related_fields.items()
+            if field in fields
+        ]
+        deferred = [field for field in self.deferred_fields
+                    if field not in fields]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+
+class ValuesListMixin:
+    """
+    Отдаёт списки через быструю сериализацию из .values().
+
+    Ответ тот же, что у serializer_class: поля берутся из его Meta.fields
+    с учётом ?fields= и ?omit=.
+    """
+
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class(sparse_field_names(
+            request, self.get_serializer_class().Meta.fields
+        ))
+        queryset = serializer.values(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.represent(page))
+        return Response(serializer.represent(queryset))
+
+
+class NameSlugModelViewSet(ETagMixin,
+                           mixins.CreateModelMixin,
                            mixins.ListModelMixin,
                            mixins.DestroyModelMixin,
                            viewsets.GenericViewSet):
-    """Абстрактный класс для вьюсетов категория/жанр."""
+    """
+    Абстрактный класс для вьюсетов категория/жанр.
+
+    Список и поиск отдаются из снимка справочника в памяти (catalog)
+    через те же фильтры и пагинацию; пока снимок отстал от БД - из БД.
+    """
 
-    filter_backends = (filters.SearchFilter,)
+    filter_backends = (CatalogSearchFilter,)
     search_fields = ('name',)
     lookup_field = 'slug'
     permission_classes = [IsAdminOrReadOnly]
+    catalog = None
+
+    def get_queryset(self):
+        if self.action == 'list':
+            rows = self.catalog.rows()
+            if rows is not None:
+                return rows
+        return super().get_queryset()
 
 
 class GenreViewSet(NameSlugModelViewSet):
@@ -184,6 +283,8 @@ class GenreViewSet(NameSlugModelViewSet):
 
     serializer_class = GenreSerializer
     queryset = Genre.objects.all()
+    etag_namespaces = (GENRES,)
+    catalog = genre_catalog
 
 
 class CategoryViewSet(NameSlugModelViewSet):
@@ -193,20 +294,276 @@ class CategoryViewSet(NameSlugModelViewSet):
 
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
+    etag_namespaces = (CATEGORIES,)
+    catalog = category_catalog
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(ETagMixin, CachedResponseMixin, SparseQuerysetMixin,
+                   FragmentListMixin, viewsets.ModelViewSet):
     """Вьюсет для произведений.
-    Доступные действия: весь набор.
-    Поиск по полям: название, год, slug жанры(ы), slug категория."""
+    Параметры списка и дополнительные эндпоинты описаны у методов."""
 
-    queryset = Title.objects.annotate(
-        rating=Avg('reviews__score')).order_by('rating')
-    filter_backends = (DjangoFilterBackend,)
+    queryset = Title.objects.order_by('rating')
+    filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     http_method_names = ['get', 'post', 'patch', 'delete']
     filterset_class = TitleFilter
     permission_classes = (IsAdminOrReadOnly,)
-    ordering_fields = ('name',)
+    ordering_fields = ('rating', 'weighted_rating', 'name', 'year')
+    cache_namespace = TITLES
+    values_serializer_class = TitleValuesSerializer
+    fragment_cache = title_fragments
+    select_related_fields = {'category': 'category'}
+    prefetch_related_fields = {'genre': 'genre'}
+    deferred_fields = ('description',)
+    etag_namespaces = (TITLES,)
+
+    @property
+    def paginator(self):
+        """
+        ?pagination=cursor включает курсорную пагинацию с сортировкой
+        ?ordering= из TITLE_CURSOR_ORDERINGS.
+        """
+        if (not hasattr(self, '_paginator')
+                and self.request.query_params.get('pagination')
+                == CURSOR_PAGINATION):
+            self._paginator = TitleCursorPagination()
+        return super().paginator
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_requested_ids(self):
+        """
+        id из ?ids=1,2,3 (не больше TITLE_IDS_BATCH_MAX_SIZE) для списка
+        или None, если параметра нет.
+        """
+        if self.action != 'list' or 'ids' not in self.request.query_params:
+            return None
+        return parse_id_list(
+            self.request.query_params['ids'], TITLE_IDS_BATCH_MAX_SIZE
+        )
+
+    def filter_queryset(self, queryset):
+        """С ?ids= отдаёт только эти произведения в запрошенном порядке."""
+        queryset = super().filter_queryset(queryset)
+        ids = self.get_requested_ids()
+        if ids is None:
+            return queryset
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *(When(pk=pk, then=position) for position, pk in enumerate(ids))
+        ))
+
+    def paginate_queryset(self, queryset):
+        if self.get_requested_ids() is not None:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def get_cache_versions(self):
+        """Ответ произведения кэшируется под теми же версиями, что ETag."""
+        if self.action != 'retrieve':
+            return super().get_cache_versions()
+        return self.get_etag_versions()
+
+    def get_etag_versions(self):
+        """
+        ETag произведения зависит от его версии, жанров, категорий и
+        пересчёта взвешенных рейтингов.
+        """
+        if self.action != 'retrieve':
+            return super().get_etag_versions()
+        try:
+            pk = int(self.kwargs[self.lookup_field])
+        except ValueError:
+            return None
+        return [
+            get_version(GENRES), get_version(CATEGORIES),
+            get_version(WEIGHTED_RATINGS), get_version(TITLES, pk)
+        ]
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Создаёт пачку произведений из JSON-массива одним запросом."""
+        serializer = TitleBulkSerializer(
+            data=request.data, many=True, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        titles = serializer.save()
+        representation = TitleValuesSerializer(
+            TitleReadOnlySerializer.Meta.fields
+        )
+        rows = representation.values(
+            Title.objects.filter(pk__in=[title.pk for title in titles])
+            .order_by('pk')
+        )
+        return Response(
+            representation.represent(rows), status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['get'], url_path='top')
+    def top(self, request):
+        """
+        Топ произведений по рейтингу: общий, ?genre=<slug> или
+        ?category=<slug>. Читается из материализованной таблицы
+        одним запросом по индексу (раздел, id раздела, место).
+        """
+        genre = request.query_params.get('genre')
+        category = request.query_params.get('category')
+        if genre and category:
+            raise ValidationError(
+                'Укажите либо genre, либо category, но не оба сразу.'
+            )
+        if genre:
+            board = Leaderboard.objects.filter(
+                scope=Leaderboard.Scope.GENRE,
+                scope_id=Subquery(
+                    Genre.objects.filter(slug=genre).values('pk')
+                ),
+            )
+        elif category:
+            board = Leaderboard.objects.filter(
+                scope=Leaderboard.Scope.CATEGORY,
+                scope_id=Subquery(
+                    Category.objects.filter(slug=category).values('pk')
+                ),
+            )
+        else:
+            board = Leaderboard.objects.filter(
+                scope=Leaderboard.Scope.OVERALL, scope_id=0
+            )
+        rows = board.order_by('position').values_list(
+            'position', 'title_id', 'title__name', 'title__year', 'rating'
+        )
+        return Response([
+            {
+                'position': position,
+                'id': title_id,
+                'name': name,
+                'year': year,
+                'rating': int(rating),
+            }
+            for position, title_id, name, year, rating in rows
+        ])
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk=None):
+        """
+        Похожие произведения по оценкам пользователей. Читаются из
+        таблицы, которую собирает build_similar_titles, одним запросом
+        по индексу (произведение, место).
+        """
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        rows = list(SimilarTitle.objects.filter(
+            title_id=pk
+        ).order_by('position').values_list(
+            'similar_id', 'similar__name', 'similar__year',
+            'similar__rating', 'score'
+        ))
+        if not rows:
+            get_object_or_404(Title, pk=pk)
+        return Response([
+            {
+                'id': title_id,
+                'name': name,
+                'year': year,
+                'rating': None if rating is None else int(rating),
+                'score': round(score, 4),
+            }
+            for title_id, name, year, rating, score in rows
+        ])
+
+    @action(detail=False, methods=['get'], url_path='histograms')
+    def histograms(self, request):
+        """Распределения оценок нескольких произведений одним запросом."""
+        ids = parse_id_list(request.query_params.get('ids'))
+        histograms = score_histograms(ids)
+        return Response([
+            {'id': title_id, 'histogram': histograms[title_id]}
+            for title_id in ids if title_id in histograms
+        ])
+
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request):
+        """
+        Количество произведений по жанрам, категориям и десятилетиям
+        для тех же параметров, что и у списка. Кэшируется и отдаёт
+        ETag так же, как список.
+        """
+        return self.conditional_response(
+            partial(self.cached_response, self.facet_counts), request
+        )
+
+    def facet_counts(self, request):
+        queryset = DjangoFilterBackend().filter_queryset(
+            request, self.get_queryset(), self
+        )
+        return Response(title_facets(queryset))
+
+    @action(detail=False, methods=['get'], url_path='autocomplete')
+    def autocomplete(self, request):
+        """
+        Подсказки по началу слова в названии, лучшие по рейтингу.
+        Отвечает из индекса названий в памяти, без запросов к БД.
+        """
+        matches = title_name_index.complete(
+            request.query_params.get('q', ''), AUTOCOMPLETE_LIMIT
+        )
+        return Response([
+            {
+                'id': title_id,
+                'name': name,
+                'rating': None if rating is None else int(rating),
+            }
+            for title_id, name, rating in matches
+        ])
+
+    @action(detail=False, methods=['get'], url_path='export',
+            permission_classes=(IsAdminOrSuperuser,))
+    def export(self, request):
+        """
+        Выгружает каталог (с фильтрами списка) в NDJSON: по произведению
+        в строке, поля как в списке. Ответ пишется по мере чтения пачек
+        по id, поэтому память не растёт с размером каталога.
+        """
+        queryset = DjangoFilterBackend().filter_queryset(
+            request, self.get_queryset(), self
+        )
+        serializer = TitleValuesSerializer(
+            TitleReadOnlySerializer.Meta.fields
+        )
+
+        def lines():
+            for chunk in serializer.represent_chunks(
+                queryset, EXPORT_CHUNK_SIZE
+            ):
+                yield ''.join(
+                    json.dumps(row, ensure_ascii=False) + '\n'
+                    for row in chunk
+                ).encode('utf-8')
+
+        return StreamingHttpResponse(
+            lines(), content_type='application/x-ndjson; charset=utf-8'
+        )
+
+    def get_serializer_context(self):
+        """
+        ?histogram=1 добавляет к произведению распределение оценок,
+        ?include=reviews,counts - первую страницу отзывов и количество
+        отзывов и комментариев.
+        """
+        context = super().get_serializer_context()
+        if self.action != 'retrieve':
+            return context
+        query_params = self.request.query_params
+        context['histogram'] = query_params.get('histogram') in ('1', 'true')
+        context['include'] = set(
+            query_params.get('include', '').split(',')
+        ).intersection(TITLE_INCLUDES)
+        return context
 
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
@@ -214,16 +571,27 @@ class TitleViewSet(viewsets.ModelViewSet):
         return TitleSerializer
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(SparseQuerysetMixin, ValuesListMixin, ModelViewSet):
     """Вьюсет для ревью."""
 
     serializer_class = ReviewSerializer
+    values_serializer_class = ReviewValuesSerializer
+    select_related_fields = {'author': 'author'}
+    deferred_fields = ('text',)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           IsAuthorOrModeratorOrAdmin,)
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_title(self):
-        return get_object_or_404(Title, pk=self.kwargs.get('title_id'))
+        if not hasattr(self, '_title'):
+            self._title = get_object_or_404(
+                Title, pk=self.kwargs.get('title_id')
+            )
+        return self._title
+
+    def get_estimated_count(self, queryset):
+        """Количество отзывов ведёт счётчик рейтинга произведения."""
+        return self.get_title().rating_count
 
     def get_queryset(self):
         title = self.get_title()
@@ -234,10 +602,13 @@ class ReviewViewSet(ModelViewSet):
         serializer.save(author=self.request.user, title=title)
 
 
-class CommentViewSet(ModelViewSet):
+class CommentViewSet(SparseQuerysetMixin, ValuesListMixin, ModelViewSet):
     """Вьюсет для комментариев."""
 
     serializer_class = CommentSerializer
+    values_serializer_class = CommentValuesSerializer
+    select_related_fields = {'author': 'author'}
+    deferred_fields = ('text',)
     permission_classes = (
         permissions.IsAuthenticatedOrReadOnly,
         IsAuthorOrModeratorOrAdmin
@@ -1,3 +1,4 @@
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -71,6 +72,24 @@ DATABASES = {
 }
 
 
+# Cache
+# ETag, кэш ответов и фрагментов и индексы в памяти сверяются с версиями
+# в кэше, поэтому работают, только если кэш общий для всех воркеров:
+# Memcached, Redis, DatabaseCache (после createcachetable) или
+# FileBasedCache на одной машине. С кэшем в памяти процесса (по
+# умолчанию) они отключаются, см. api.cache.shared_cache().
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'DJANGO_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,7 +135,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.EstimatedCountPagination',
     'PAGE_SIZE': 10,
 }
 
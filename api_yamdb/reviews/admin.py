@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from reviews.models import Category, Comment, Genre, Review, Title
+from reviews.models import (Category, Comment, Genre, Leaderboard, Review,
+                            SimilarTitle, Title)
 
 
 class DisplayModelAdmin(admin.ModelAdmin):
@@ -31,7 +32,8 @@ class TitleAdmin(DisplayModelAdmin):
     list_editable = (
         'category',
     )
-    list_display = ('name', 'genres', 'category', 'year', 'description')
+    list_display = ('name', 'genres', 'category', 'year', 'rating',
+                    'description')
 
     def genres(self, obj):
         title_genres = obj.genres.all()
@@ -46,3 +48,15 @@ class ReviewAdmin(DisplayModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(DisplayModelAdmin):
     """Admin Comment."""
+
+
+@admin.register(Leaderboard)
+class LeaderboardAdmin(DisplayModelAdmin):
+    """Admin Leaderboard."""
+
+    list_filter = ('scope',)
+
+
+@admin.register(SimilarTitle)
+class SimilarTitleAdmin(DisplayModelAdmin):
+    """Admin SimilarTitle."""
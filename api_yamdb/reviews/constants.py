@@ -12,3 +12,26 @@ USERNAME_REGEX = r'^[\w.@+-]+\Z'
 FORBIDDEN_USERNAME = 'me'
 ROLE_NAME_MAX_LENGTH = 100
 MODELS_NAME_LENGTH = 256
+TITLE_CURSOR_ORDERINGS = ('rating', '-rating', 'weighted_rating',
+                          '-weighted_rating', 'name', '-name')
+CURSOR_PAGINATION = 'cursor'
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+TITLE_SEARCH_WEIGHTS = '10.0, 1.0'
+GENRE_INDEX_MAX_IDS = 900
+TITLE_BULK_MAX_SIZE = 1000
+LEADERBOARD_SIZE = 10
+LEADERBOARD_SCOPE_LENGTH = 16
+TITLE_IDS_MAX_SIZE = 100
+TITLE_IDS_BATCH_MAX_SIZE = 200
+WEIGHTED_RATING_MIN_REVIEWS = 10
+WEIGHTED_RATING_CHUNK_SIZE = 1000
+TITLE_INCLUDES = ('reviews', 'counts')
+FACET_YEAR_BUCKET = 10
+EXPORT_CHUNK_SIZE = 500
+AUTOCOMPLETE_LIMIT = 10
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+EXACT_COUNT_THRESHOLD = 1000
+SIMILAR_TITLES_SIZE = 10
+SIMILAR_TITLES_MIN_COMMON = 2
+SIMILAR_TITLES_BATCH_SIZE = 500
+MEMORY_INDEX_MAX_AGE = 60
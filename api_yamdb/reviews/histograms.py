@@ -0,0 +1,68 @@
+from django.db.models import Count, F
+
+from reviews.constants import MAX_SCORE_VALUE, MIN_SCORE_VALUE
+from reviews.models import Review, ScoreHistogram, Title
+
+SCORES = range(MIN_SCORE_VALUE, MAX_SCORE_VALUE + 1)
+SCORE_FIELDS = ScoreHistogram.SCORE_FIELDS
+
+
+def score_field(score):
+    return f'score_{score}'
+
+
+def recalculate_score_histograms(title_ids):
+    """Пересобирает счётчики оценок одной группировкой по отзывам."""
+    counts = {title_id: {} for title_id in title_ids}
+    rows = Review.objects.filter(title_id__in=title_ids).order_by().values(
+        'title_id', 'score'
+    ).annotate(total=Count('pk')).values_list('title_id', 'score', 'total')
+    for title_id, score, total in rows:
+        counts[title_id][score_field(score)] = total
+    for title_id, title_counts in counts.items():
+        ScoreHistogram.objects.update_or_create(
+            title_id=title_id,
+            defaults={
+                field: title_counts.get(field, 0) for field in SCORE_FIELDS
+            },
+        )
+
+
+def update_score_histogram(title_id, deltas):
+    """
+    Сдвигает счётчики оценок произведения одним UPDATE.
+
+    deltas - словарь «оценка -> изменение». Если строки ещё нет (первый
+    отзыв), она собирается из таблицы отзывов. Одни лишь уменьшения
+    строку не заводят: так каскадное удаление произведения не создаёт
+    её заново.
+    """
+    changes = {
+        score_field(score): F(score_field(score)) + delta
+        for score, delta in deltas.items() if delta
+    }
+    if not changes:
+        return
+    updated = ScoreHistogram.objects.filter(title_id=title_id).update(
+        **changes
+    )
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        recalculate_score_histograms([title_id])
+
+
+def score_histograms(title_ids):
+    """
+    Распределения оценок произведений одним запросом.
+
+    Возвращает словарь «id произведения -> {оценка: количество}» только
+    для существующих произведений; без отзывов все счётчики равны нулю.
+    """
+    rows = Title.objects.filter(pk__in=title_ids).order_by().values_list(
+        'pk', *(f'score_histogram__{field}' for field in SCORE_FIELDS)
+    )
+    return {
+        title_id: {
+            str(score): count or 0 for score, count in zip(SCORES, counts)
+        }
+        for title_id, *counts in rows
+    }
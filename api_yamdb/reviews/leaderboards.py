@@ -0,0 +1,170 @@
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from reviews.constants import LEADERBOARD_SIZE
+from reviews.models import GenreTitle, Leaderboard, Title
+
+Scope = Leaderboard.Scope
+
+# Накопитель отложенных обновлений текущей транзакции потока.
+_pending = threading.local()
+
+
+def scope_titles(scope, scope_id):
+    """Произведения с рейтингом, которые участвуют в топе раздела."""
+    titles = Title.objects.filter(rating__isnull=False)
+    if scope == Scope.GENRE:
+        return titles.filter(genre=scope_id)
+    if scope == Scope.CATEGORY:
+        return titles.filter(category_id=scope_id)
+    return titles
+
+
+def board_titles(scope, scope_id):
+    """
+    Выборка top-K раздела: (id, рейтинг) по убыванию рейтинга и id.
+
+    Оба поля сортировки по убыванию, чтобы общий топ читался обратным
+    обходом title_rating_id_idx, а топ категории - обходом
+    title_category_rating_id_idx, без сортировки во временном B-дереве.
+    """
+    return scope_titles(scope, scope_id).order_by(
+        '-rating', '-pk'
+    ).values_list('pk', 'rating')[:LEADERBOARD_SIZE]
+
+
+def refresh_board(scope, scope_id):
+    """Пересобирает один топ: одна выборка top-K и одна вставка."""
+    top = board_titles(scope, scope_id)
+    with transaction.atomic():
+        Leaderboard.objects.filter(scope=scope, scope_id=scope_id).delete()
+        Leaderboard.objects.bulk_create(
+            Leaderboard(scope=scope, scope_id=scope_id, position=position,
+                        title_id=title_id, rating=rating)
+            for position, (title_id, rating) in enumerate(top, 1)
+        )
+
+
+def title_scopes(title_id):
+    """Разделы, в которых произведение может попасть в топ."""
+    scopes = {(Scope.OVERALL, 0)}
+    category_id = Title.objects.filter(
+        pk=title_id
+    ).values_list('category_id', flat=True).first()
+    if category_id is not None:
+        scopes.add((Scope.CATEGORY, category_id))
+    scopes.update(
+        (Scope.GENRE, genre_id) for genre_id in GenreTitle.objects.filter(
+            title_id=title_id
+        ).values_list('genre_id', flat=True)
+    )
+    return scopes
+
+
+def refresh_title(title_id, scopes=None):
+    """
+    Обновляет топы, на которые могло повлиять изменение произведения.
+
+    Без scopes проверяются все разделы произведения и все топы, где оно
+    уже есть. Топ пересобирается, только если произведение в нём есть
+    или теперь проходит в него по рейтингу; остальные не трогаются.
+    """
+    rating = Title.objects.filter(
+        pk=title_id
+    ).values_list('rating', flat=True).first()
+    if scopes is None:
+        scopes = title_scopes(title_id) | set(
+            Leaderboard.objects.filter(
+                title_id=title_id
+            ).values_list('scope', 'scope_id')
+        )
+    condition = Q()
+    for scope, scope_id in scopes:
+        condition |= Q(scope=scope, scope_id=scope_id)
+    boards = defaultdict(list)
+    for scope, scope_id, board_title_id, board_rating in (
+        Leaderboard.objects.filter(condition).values_list(
+            'scope', 'scope_id', 'title_id', 'rating'
+        )
+    ):
+        boards[(scope, scope_id)].append((board_title_id, board_rating))
+    for key in scopes:
+        board = boards[key]
+        listed = any(board_title_id == title_id for board_title_id, _ in board)
+        qualifies = rating is not None and (
+            len(board) < LEADERBOARD_SIZE
+            or rating >= min(board_rating for _, board_rating in board)
+        )
+        if listed or qualifies:
+            refresh_board(*key)
+
+
+class PendingTitles:
+    """
+    Отложенные обновления топов одной транзакции.
+
+    Хранит «id произведения -> разделы (None - все)» и регистрируется
+    в on_commit один раз на транзакцию. При откате Django отбрасывает
+    обработчик вместе с накопленными произведениями.
+    """
+
+    def __init__(self):
+        self.titles = {}
+
+    def add(self, title_id, scopes):
+        if title_id in self.titles:
+            current = self.titles[title_id]
+            self.titles[title_id] = (
+                None if current is None or scopes is None
+                else current | set(scopes)
+            )
+        else:
+            self.titles[title_id] = None if scopes is None else set(scopes)
+
+    def __call__(self):
+        titles, self.titles = self.titles, {}
+        for title_id, scopes in titles.items():
+            refresh_title(title_id, scopes)
+
+
+def refresh_title_on_commit(title_id, scopes=None):
+    """
+    Откладывает refresh_title() до фиксации транзакции.
+
+    Вызовы для одного произведения в транзакции объединяются: разделы
+    складываются, и топы пересчитываются один раз, сколько бы связей
+    ни изменилось. Вне транзакции топы пересчитываются сразу.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh_title(title_id, scopes)
+        return
+    # Список обработчиков соединения заменяется новым после фиксации
+    # и при любом откате: тогда накопитель прошлой транзакции больше
+    # не используется, и регистрируется новый.
+    hooks, pending = getattr(_pending, 'state', (None, None))
+    if hooks is not connection.run_on_commit:
+        pending = PendingTitles()
+        transaction.on_commit(pending)
+        _pending.state = (connection.run_on_commit, pending)
+    pending.add(title_id, scopes)
+
+
+def refresh_board_on_commit(scope, scope_id):
+    transaction.on_commit(lambda: refresh_board(scope, scope_id))
+
+
+def rebuild_all():
+    """Пересобирает все топы: общий, по каждому жанру и категории."""
+    refresh_board(Scope.OVERALL, 0)
+    for genre_id in GenreTitle.objects.values_list(
+        'genre_id', flat=True
+    ).distinct().order_by():
+        refresh_board(Scope.GENRE, genre_id)
+    for category_id in Title.objects.filter(
+        category__isnull=False
+    ).values_list('category_id', flat=True).distinct().order_by():
+        refresh_board(Scope.CATEGORY, category_id)
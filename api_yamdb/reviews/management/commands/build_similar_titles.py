@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from reviews.constants import (SIMILAR_TITLES_BATCH_SIZE,
+                               SIMILAR_TITLES_MIN_COMMON, SIMILAR_TITLES_SIZE)
+from reviews.similarity import build_similar_titles, refresh_stale_titles
+
+
+class Command(BaseCommand):
+    """
+    Собирает похожие произведения по косинусной близости оценок.
+
+    По умолчанию пересчитываются только произведения, отзывы которых
+    изменились с прошлого запуска, и произведения с общими с ними
+    оценщиками; --all пересобирает весь каталог.
+    """
+
+    help = ('Build top-K similar titles from review co-ratings; '
+            'only changed and co-rated titles unless --all is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true')
+        parser.add_argument('--size', type=int, default=SIMILAR_TITLES_SIZE)
+        parser.add_argument('--min-common', type=int,
+                            default=SIMILAR_TITLES_MIN_COMMON)
+        parser.add_argument('--batch-size', type=int,
+                            default=SIMILAR_TITLES_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        params = {
+            'size': options['size'],
+            'min_common': options['min_common'],
+            'batch_size': options['batch_size'],
+        }
+        if options['all']:
+            count = build_similar_titles(**params)
+        else:
+            count = refresh_stale_titles(**params)
+        self.stdout.write(f'Похожие пересчитаны: {count} произведений.')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from reviews.leaderboards import rebuild_all
+
+
+class Command(BaseCommand):
+    """Пересобирает материализованные топы произведений с нуля."""
+
+    help = 'Rebuild overall, per-genre and per-category title leaderboards.'
+
+    def handle(self, *args, **options):
+        rebuild_all()
+        self.stdout.write('Топы произведений пересобраны.')
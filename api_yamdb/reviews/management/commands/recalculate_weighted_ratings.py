@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+from django.core.management.base import BaseCommand
+
+from api.cache import TITLES, WEIGHTED_RATINGS, bump_version
+from reviews.constants import (WEIGHTED_RATING_CHUNK_SIZE,
+                               WEIGHTED_RATING_MIN_REVIEWS)
+from reviews.models import Title
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает взвешенный (байесовский) рейтинг произведений.
+
+    WR = (v * R + m * C) / (v + m) = (сумма оценок + m * C) / (v + m),
+    где v - количество отзывов, R - средняя оценка произведения,
+    C - средняя оценка по всем отзывам, m - вес априорного среднего.
+    Произведение с одним отзывом почти не отходит от C, а рейтинг
+    произведения с тысячами отзывов почти равен его среднему.
+
+    Сумма и количество оценок уже хранятся в Title.rating_sum и
+    Title.rating_count, поэтому отзывы не читаются: C считается одним
+    агрегатом по произведениям, затем произведения обновляются пачками
+    по диапазонам id, на пачку один UPDATE без подзапросов.
+    """
+
+    help = ('Recalculate Title.weighted_rating with chunked set-based '
+            'UPDATEs from the stored rating sums.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-reviews', type=int,
+                            default=WEIGHTED_RATING_MIN_REVIEWS)
+        parser.add_argument('--chunk-size', type=int,
+                            default=WEIGHTED_RATING_CHUNK_SIZE)
+
+    def get_weighted_rating(self, prior_mean, prior_weight):
+        """Выражение WR; без отзывов (и для произведений без них) - NULL."""
+        if prior_mean is None:
+            return Value(None, output_field=FloatField())
+        return Case(
+            When(
+                rating_count__gt=0,
+                then=(
+                    (Cast('rating_sum', FloatField())
+                     + prior_mean * prior_weight)
+                    / (F('rating_count') + prior_weight)
+                ),
+            ),
+            default=None,
+            output_field=FloatField(),
+        )
+
+    def handle(self, *args, **options):
+        prior_weight = options['min_reviews']
+        chunk_size = options['chunk_size']
+        totals = Title.objects.aggregate(
+            score_sum=Sum('rating_sum'), score_count=Sum('rating_count')
+        )
+        prior_mean = (
+            totals['score_sum'] / totals['score_count']
+            if totals['score_count'] else None
+        )
+        weighted_rating = self.get_weighted_rating(prior_mean, prior_weight)
+        last_id, updated = 0, 0
+        while True:
+            titles = Title.objects.filter(pk__gt=last_id)
+            upper_id = titles.order_by('pk').values_list(
+                'pk', flat=True
+            )[chunk_size - 1:chunk_size].first()
+            if upper_id is not None:
+                titles = titles.filter(pk__lte=upper_id)
+            with transaction.atomic():
+                updated += titles.update(weighted_rating=weighted_rating)
+            if upper_id is None:
+                break
+            last_id = upper_id
+        bump_version(TITLES)
+        bump_version(WEIGHTED_RATINGS)
+        self.stdout.write(
+            f'Взвешенный рейтинг пересчитан: {updated} произведений, '
+            f'C={prior_mean}, m={prior_weight}.'
+        )
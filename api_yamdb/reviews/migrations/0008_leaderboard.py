@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-17 04:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from reviews.constants import LEADERBOARD_SIZE
+
+
+def fill_leaderboards(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    GenreTitle = apps.get_model('reviews', 'GenreTitle')
+    Leaderboard = apps.get_model('reviews', 'Leaderboard')
+    titles = Title.objects.filter(rating__isnull=False)
+    boards = [('overall', 0, titles)]
+    boards.extend(
+        ('genre', genre_id, titles.filter(genre=genre_id))
+        for genre_id in GenreTitle.objects.values_list(
+            'genre_id', flat=True
+        ).distinct().order_by()
+    )
+    boards.extend(
+        ('category', category_id, titles.filter(category_id=category_id))
+        for category_id in titles.filter(
+            category__isnull=False
+        ).values_list('category_id', flat=True).distinct().order_by()
+    )
+    for scope, scope_id, queryset in boards:
+        top = queryset.order_by('-rating', '-pk').values_list(
+            'pk', 'rating'
+        )[:LEADERBOARD_SIZE]
+        Leaderboard.objects.bulk_create(
+            Leaderboard(scope=scope, scope_id=scope_id, position=position,
+                        title_id=title_id, rating=rating)
+            for position, (title_id, rating) in enumerate(top, 1)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_title_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('overall', 'Все произведения'), ('genre', 'Жанр'), ('category', 'Категория')], max_length=16, verbose_name='Раздел')),
+                ('scope_id', models.PositiveBigIntegerField(default=0, verbose_name='id жанра или категории')),
+                ('position', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('rating', models.FloatField(verbose_name='Рейтинг')),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.title', verbose_name='Произведение')),
+            ],
+            options={
+                'verbose_name': 'место в топе',
+                'verbose_name_plural': 'Топы произведений',
+                'ordering': ('scope', 'scope_id', 'position'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboard',
+            constraint=models.UniqueConstraint(fields=('scope', 'scope_id', 'position'), name='unique_leaderboard_position'),
+        ),
+        migrations.RunPython(fill_leaderboards, migrations.RunPython.noop),
+    ]
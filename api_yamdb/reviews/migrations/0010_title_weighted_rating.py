@@ -0,0 +1,36 @@
+# Generated by Django 3.2 on 2026-10-17 04:54
+
+from django.db import migrations, models
+
+from reviews.search import install_title_search
+
+
+def reinstall_title_search(apps, schema_editor):
+    # SQLite пересоздаёт reviews_title при добавлении и удалении колонки,
+    # триггеры полнотекстового индекса при этом пропадают.
+    install_title_search(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_score_histogram'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, reinstall_title_search
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='weighted_rating',
+            field=models.FloatField(blank=True, editable=False, help_text='Пересчитывается командой recalculate_weighted_ratings.', null=True, verbose_name='Взвешенный рейтинг'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['weighted_rating', 'id'], name='title_weighted_rating_id_idx'),
+        ),
+        migrations.RunPython(
+            reinstall_title_search, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2 on 2026-10-17 05:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def queue_reviewed_titles(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    SimilarTitlesQueue = apps.get_model('reviews', 'SimilarTitlesQueue')
+    SimilarTitlesQueue.objects.bulk_create(
+        SimilarTitlesQueue(title_id=title_id)
+        for title_id in Review.objects.order_by().values_list(
+            'title_id', flat=True
+        ).distinct()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_title_weighted_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarTitlesQueue',
+            fields=[
+                ('title_id', models.PositiveBigIntegerField(primary_key=True, serialize=False, verbose_name='id произведения')),
+            ],
+            options={
+                'verbose_name': 'произведение к пересчёту похожих',
+                'verbose_name_plural': 'Очередь пересчёта похожих',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarTitle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Косинусная близость')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.title', verbose_name='Похожее произведение')),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reviews.title', verbose_name='Произведение')),
+            ],
+            options={
+                'verbose_name': 'похожее произведение',
+                'verbose_name_plural': 'Похожие произведения',
+                'ordering': ('title', 'position'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similartitle',
+            constraint=models.UniqueConstraint(fields=('title', 'position'), name='unique_similar_title_position'),
+        ),
+        migrations.RunPython(
+            queue_reviewed_titles, migrations.RunPython.noop
+        ),
+    ]
@@ -1,9 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import (MaxValueValidator, MinValueValidator)
-from django.db import models
+from django.db import models, transaction
 
 from api.validators import real_year
 from reviews.constants import (
+    LEADERBOARD_SCOPE_LENGTH,
     MAX_SCORE_VALUE,
     MIN_SCORE_VALUE,
     MODELS_NAME_LENGTH,
@@ -68,11 +69,51 @@ class Title(models.Model):
         null=True,
         verbose_name='Категория'
     )
+    rating_sum = models.PositiveIntegerField(
+        'Сумма оценок',
+        default=0,
+        editable=False,
+    )
+    rating_count = models.PositiveIntegerField(
+        'Количество оценок',
+        default=0,
+        editable=False,
+    )
+    rating = models.FloatField(
+        'Рейтинг',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    weighted_rating = models.FloatField(
+        'Взвешенный рейтинг',
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Пересчитывается командой recalculate_weighted_ratings.',
+    )
 
     class Meta:
         verbose_name = 'произведения'
         verbose_name_plural = 'Произведение'
         ordering = ('name', '-year')
+        indexes = (
+            models.Index(fields=('rating', 'id'), name='title_rating_id_idx'),
+            models.Index(
+                fields=('weighted_rating', 'id'),
+                name='title_weighted_rating_id_idx'
+            ),
+            models.Index(fields=('name', 'id'), name='title_name_id_idx'),
+            models.Index(fields=('name', '-year'), name='title_name_year_idx'),
+            models.Index(fields=('year',), name='title_year_idx'),
+            models.Index(
+                fields=('category', 'year'), name='title_category_year_idx'
+            ),
+            models.Index(
+                fields=('category', 'rating', 'id'),
+                name='title_category_rating_id_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name[:SLICE_LENGTH]}, {self.year}'
@@ -93,6 +134,11 @@ class GenreTitle(models.Model):
                 name='unique_title_genre'
             )
         ]
+        indexes = (
+            models.Index(
+                fields=('genre', 'title'), name='genretitle_genre_title_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.genre} у {self.title[:SLICE_LENGTH]}'
@@ -154,6 +200,19 @@ class Review(AuthorTextPubDateBaseModel):
             )
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминает оценку и произведение на момент загрузки из БД."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_score = instance.__dict__.get('score')
+        instance._loaded_title_id = instance.__dict__.get('title_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Сохраняет отзыв и пересчитывает рейтинг в одной транзакции."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Comment(AuthorTextPubDateBaseModel):
     """Модель для представления комментария к посту."""
@@ -169,3 +228,143 @@ class Comment(AuthorTextPubDateBaseModel):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         default_related_name = 'comments'
+
+
+class Leaderboard(models.Model):
+    """Материализованный топ произведений по рейтингу."""
+
+    class Scope(models.TextChoices):
+        OVERALL = 'overall', 'Все произведения'
+        GENRE = 'genre', 'Жанр'
+        CATEGORY = 'category', 'Категория'
+
+    scope = models.CharField(
+        'Раздел',
+        max_length=LEADERBOARD_SCOPE_LENGTH,
+        choices=Scope.choices,
+    )
+    scope_id = models.PositiveBigIntegerField(
+        'id жанра или категории',
+        default=0,
+    )
+    position = models.PositiveSmallIntegerField('Место')
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Произведение',
+    )
+    rating = models.FloatField('Рейтинг')
+
+    class Meta:
+        verbose_name = 'место в топе'
+        verbose_name_plural = 'Топы произведений'
+        ordering = ('scope', 'scope_id', 'position')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'scope_id', 'position'],
+                name='unique_leaderboard_position'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.scope} {self.scope_id}: {self.position}'
+
+
+class ScoreHistogram(models.Model):
+    """
+    Распределение оценок произведения: по счётчику на каждый балл.
+
+    Строка заводится при первом отзыве и сдвигается сигналами отзывов,
+    поэтому на чтении не нужна группировка по таблице отзывов.
+    """
+
+    SCORE_FIELDS = tuple(
+        f'score_{score}'
+        for score in range(MIN_SCORE_VALUE, MAX_SCORE_VALUE + 1)
+    )
+
+    title = models.OneToOneField(
+        Title,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score_histogram',
+        verbose_name='Произведение',
+    )
+    score_1 = models.PositiveIntegerField('Оценок 1', default=0)
+    score_2 = models.PositiveIntegerField('Оценок 2', default=0)
+    score_3 = models.PositiveIntegerField('Оценок 3', default=0)
+    score_4 = models.PositiveIntegerField('Оценок 4', default=0)
+    score_5 = models.PositiveIntegerField('Оценок 5', default=0)
+    score_6 = models.PositiveIntegerField('Оценок 6', default=0)
+    score_7 = models.PositiveIntegerField('Оценок 7', default=0)
+    score_8 = models.PositiveIntegerField('Оценок 8', default=0)
+    score_9 = models.PositiveIntegerField('Оценок 9', default=0)
+    score_10 = models.PositiveIntegerField('Оценок 10', default=0)
+
+    class Meta:
+        verbose_name = 'распределение оценок'
+        verbose_name_plural = 'Распределения оценок'
+
+    def __str__(self):
+        return f'Оценки {self.title_id}'
+
+
+class SimilarTitle(models.Model):
+    """
+    Заранее посчитанный сосед произведения по оценкам пользователей.
+
+    Строки пересобирает команда build_similar_titles; на чтении список
+    похожих - одна выборка по индексу (произведение, место).
+    """
+
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Произведение',
+    )
+    position = models.PositiveSmallIntegerField('Место')
+    similar = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожее произведение',
+    )
+    score = models.FloatField('Косинусная близость')
+
+    class Meta:
+        verbose_name = 'похожее произведение'
+        verbose_name_plural = 'Похожие произведения'
+        ordering = ('title', 'position')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['title', 'position'],
+                name='unique_similar_title_position'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.title_id}: {self.position}'
+
+
+class SimilarTitlesQueue(models.Model):
+    """
+    Произведения, у которых изменились отзывы после сборки похожих.
+
+    Обычное число вместо внешнего ключа: сигнал удаления отзывов при
+    каскадном удалении произведения не должен ссылаться на удаляемую
+    строку, а устаревшие id команда просто пропускает.
+    """
+
+    title_id = models.PositiveBigIntegerField(
+        'id произведения',
+        primary_key=True,
+    )
+
+    class Meta:
+        verbose_name = 'произведение к пересчёту похожих'
+        verbose_name_plural = 'Очередь пересчёта похожих'
+
+    def __str__(self):
+        return str(self.title_id)
@@ -0,0 +1,120 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from reviews.constants import TITLE_SEARCH_WEIGHTS
+
+TITLE_TABLE = 'reviews_title'
+TITLE_FTS_TABLE = 'reviews_title_fts'
+
+# Внешнее содержимое: индекс хранит только токены, сами строки берутся
+# из reviews_title. Триггеры держат индекс в синхронизации с таблицей,
+# UPDATE срабатывает только на изменение name и description, чтобы
+# пересчёт рейтинга не трогал индекс.
+TITLE_FTS_SQL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TITLE_FTS_TABLE} USING fts5(
+        name, description,
+        content='{TITLE_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TITLE_FTS_TABLE}_ai
+    AFTER INSERT ON {TITLE_TABLE} BEGIN
+        INSERT INTO {TITLE_FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TITLE_FTS_TABLE}_ad
+    AFTER DELETE ON {TITLE_TABLE} BEGIN
+        INSERT INTO {TITLE_FTS_TABLE}(
+            {TITLE_FTS_TABLE}, rowid, name, description
+        )
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TITLE_FTS_TABLE}_au
+    AFTER UPDATE OF name, description ON {TITLE_TABLE} BEGIN
+        INSERT INTO {TITLE_FTS_TABLE}(
+            {TITLE_FTS_TABLE}, rowid, name, description
+        )
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {TITLE_FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    INSERT INTO {TITLE_FTS_TABLE}({TITLE_FTS_TABLE}, rank)
+    VALUES ('rank', 'bm25({TITLE_SEARCH_WEIGHTS})')
+    """,
+    f"""
+    INSERT INTO {TITLE_FTS_TABLE}({TITLE_FTS_TABLE}) VALUES ('rebuild')
+    """,
+)
+DROP_TITLE_FTS_SQL = (
+    f'DROP TRIGGER IF EXISTS {TITLE_FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {TITLE_FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {TITLE_FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {TITLE_FTS_TABLE}',
+)
+
+
+def install_title_search(schema_editor):
+    """
+    Создаёт FTS5-индекс произведений и триггеры, затем перестраивает его.
+
+    SQLite пересоздаёт таблицу при многих изменениях схемы, и триггеры
+    при этом пропадают, поэтому миграции, которые пересобирают
+    reviews_title, должны вызывать эту функцию повторно.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TITLE_FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def uninstall_title_search(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_TITLE_FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def build_match_query(query):
+    """
+    Превращает пользовательский ввод в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки и ищется по префиксу, все слова
+    должны встретиться (AND), операторы FTS5 из ввода не проходят.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search_titles(queryset, query):
+    """Фильтрует произведения по полнотекстовому запросу и ранжирует их."""
+    match = build_match_query(query)
+    if not match:
+        return queryset.none()
+    if connection.vendor != 'sqlite':
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        )
+    return queryset.filter(
+        pk__in=RawSQL(
+            f'SELECT rowid FROM {TITLE_FTS_TABLE} '
+            f'WHERE {TITLE_FTS_TABLE} MATCH %s',
+            (match,)
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f'SELECT rank FROM {TITLE_FTS_TABLE} '
+            f'WHERE {TITLE_FTS_TABLE} MATCH %s '
+            f'AND rowid = "{TITLE_TABLE}"."id"',
+            (match,)
+        )
+    ).order_by('search_rank', 'pk')
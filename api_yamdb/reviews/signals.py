@@ -0,0 +1,155 @@
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from reviews import leaderboards, similarity
+from reviews.histograms import (recalculate_score_histograms,
+                                update_score_histogram)
+from reviews.models import (Category, Genre, GenreTitle, Leaderboard, Review,
+                            Title)
+
+Scope = Leaderboard.Scope
+
+
+def update_title_rating(title_id, score_delta, count_delta):
+    """
+    Сдвигает сумму и количество оценок произведения одним UPDATE.
+
+    Рейтинг пересчитывается в том же запросе из новых значений,
+    поэтому на чтении не нужен Avg() по всей таблице отзывов.
+    """
+    rating_sum = F('rating_sum') + score_delta
+    rating_count = F('rating_count') + count_delta
+    Title.objects.filter(pk=title_id).update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        rating=(
+            Cast(rating_sum, FloatField()) / NullIf(rating_count, 0)
+        ),
+    )
+
+
+def recalculate_title_rating(title_ids):
+    """Пересчитывает сумму и количество оценок по таблице отзывов."""
+    reviews = Review.objects.filter(
+        title=OuterRef('pk')
+    ).order_by().values('title')
+    rating_sum = Coalesce(
+        Subquery(reviews.annotate(total=Sum('score')).values('total')), 0
+    )
+    rating_count = Coalesce(
+        Subquery(reviews.annotate(total=Count('pk')).values('total')), 0
+    )
+    Title.objects.filter(pk__in=title_ids).update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        rating=(
+            Cast(rating_sum, FloatField()) / NullIf(rating_count, 0)
+        ),
+    )
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    """Учитывает новую или изменённую оценку в рейтинге произведения."""
+    if (hasattr(instance.__dict__.get('score'), 'resolve_expression')
+            or 'score' in instance.get_deferred_fields()):
+        # Оценка записана выражением (F() + 1) или не загружалась:
+        # к рейтингу прибавляется только значение из БД.
+        instance.refresh_from_db(fields=['score'])
+    loaded_title_id = getattr(instance, '_loaded_title_id', None)
+    loaded_score = getattr(instance, '_loaded_score', None)
+    if created:
+        update_title_rating(instance.title_id, instance.score, 1)
+        update_score_histogram(instance.title_id, {instance.score: 1})
+    elif loaded_title_id is None or loaded_score is None:
+        # Объект собран не из БД или без оценки: прежняя неизвестна.
+        recalculate_title_rating([instance.title_id])
+        recalculate_score_histograms([instance.title_id])
+    elif loaded_title_id != instance.title_id:
+        update_title_rating(loaded_title_id, -loaded_score, -1)
+        update_score_histogram(loaded_title_id, {loaded_score: -1})
+        update_title_rating(instance.title_id, instance.score, 1)
+        update_score_histogram(instance.title_id, {instance.score: 1})
+    elif loaded_score != instance.score:
+        update_title_rating(
+            instance.title_id, instance.score - loaded_score, 0
+        )
+        update_score_histogram(
+            instance.title_id, {loaded_score: -1, instance.score: 1}
+        )
+    instance._loaded_score = instance.score
+    instance._loaded_title_id = instance.title_id
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Убирает оценку удалённого отзыва из рейтинга произведения."""
+    if 'score' in instance.get_deferred_fields():
+        # Строки уже нет, оценку не перечитать: пересчёт по отзывам.
+        recalculate_title_rating([instance.title_id])
+        recalculate_score_histograms([instance.title_id])
+        return
+    update_title_rating(instance.title_id, -instance.score, -1)
+    update_score_histogram(instance.title_id, {instance.score: -1})
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed_leaderboards(sender, instance, **kwargs):
+    """Новый рейтинг может сдвинуть произведение в его топах."""
+    leaderboards.refresh_title_on_commit(instance.title_id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed_similar_titles(sender, instance, **kwargs):
+    """Вектор оценок произведения изменился: похожие нужно пересобрать."""
+    similarity.mark_stale([instance.title_id])
+
+
+@receiver(post_save, sender=Title)
+def title_saved_leaderboards(sender, instance, created, **kwargs):
+    if not created:
+        leaderboards.refresh_title_on_commit(instance.pk)
+
+
+@receiver(pre_delete, sender=Title)
+def title_deleted_leaderboards(sender, instance, **kwargs):
+    """Строки удалённого произведения уйдут каскадом, топы нужно добрать."""
+    for scope, scope_id in Leaderboard.objects.filter(
+        title=instance
+    ).values_list('scope', 'scope_id'):
+        leaderboards.refresh_board_on_commit(scope, scope_id)
+
+
+@receiver(post_save, sender=GenreTitle)
+@receiver(post_delete, sender=GenreTitle)
+def genre_title_changed_leaderboards(sender, instance, **kwargs):
+    leaderboards.refresh_title_on_commit(
+        instance.title_id, {(Scope.GENRE, instance.genre_id)}
+    )
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_changed_leaderboards(sender, instance, action, reverse,
+                                      pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        leaderboards.refresh_board_on_commit(Scope.GENRE, instance.pk)
+    elif pk_set is None:
+        leaderboards.refresh_title_on_commit(instance.pk)
+    else:
+        leaderboards.refresh_title_on_commit(
+            instance.pk, {(Scope.GENRE, pk) for pk in pk_set}
+        )
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Category)
+def scope_deleted_leaderboards(sender, instance, **kwargs):
+    scope = Scope.GENRE if sender is Genre else Scope.CATEGORY
+    Leaderboard.objects.filter(scope=scope, scope_id=instance.pk).delete()
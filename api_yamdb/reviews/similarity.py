@@ -0,0 +1,195 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from reviews.constants import (SIMILAR_TITLES_BATCH_SIZE,
+                               SIMILAR_TITLES_MIN_COMMON, SIMILAR_TITLES_SIZE)
+from reviews.models import Review, SimilarTitle, SimilarTitlesQueue
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def title_norms():
+    """Длины векторов оценок: id произведения -> sqrt(сумма квадратов)."""
+    rows = Review.objects.order_by().values('title_id').annotate(
+        square_sum=Sum(F('score') * F('score'))
+    ).values_list('title_id', 'square_sum')
+    return {
+        title_id: math.sqrt(square_sum)
+        for title_id, square_sum in rows.iterator()
+    }
+
+
+def author_ratings(title_ids=None):
+    """
+    Разреженная матрица «пользователь x произведение» по строкам.
+
+    Возвращает словарь «id автора -> [(id произведения, оценка)]».
+    Без title_ids читаются все отзывы, иначе - только отзывы авторов,
+    оценивших хотя бы одно из этих произведений: другие строки на
+    близость к ним не влияют.
+    """
+    reviews = Review.objects.order_by()
+    if title_ids is not None:
+        reviews = reviews.filter(
+            author__in=Review.objects.filter(
+                title_id__in=title_ids
+            ).values('author_id')
+        )
+    ratings = defaultdict(list)
+    for author_id, title_id, score in reviews.values_list(
+        'author_id', 'title_id', 'score'
+    ).iterator():
+        ratings[author_id].append((title_id, score))
+    return ratings
+
+
+def nearest_titles(title_ids, ratings, norms, size, min_common):
+    """
+    Top-K соседей по косинусной близости для каждого из title_ids.
+
+    Скалярные произведения набираются только по общим оценщикам:
+    от каждого автора, оценившего произведение, - по его строке
+    матрицы. Нулевые пары не перебираются, поэтому стоимость зависит
+    от числа совместных оценок, а не от размера каталога.
+    """
+    targets = set(title_ids)
+    columns = defaultdict(list)
+    for author_id, row in ratings.items():
+        for title_id, score in row:
+            if title_id in targets:
+                columns[title_id].append((author_id, score))
+    neighbours = {}
+    for title_id in title_ids:
+        dots, common = defaultdict(float), defaultdict(int)
+        for author_id, score in columns[title_id]:
+            for other_id, other_score in ratings[author_id]:
+                dots[other_id] += score * other_score
+                common[other_id] += 1
+        norm = norms.get(title_id)
+        if norm is None:
+            # Отзывы удалены после подсчёта длин: похожих нет.
+            neighbours[title_id] = []
+            continue
+        candidates = (
+            (dot / (norm * norms[other_id]), other_id)
+            for other_id, dot in dots.items()
+            if other_id != title_id
+            and common[other_id] >= min_common
+            and other_id in norms
+        )
+        neighbours[title_id] = heapq.nlargest(
+            size, candidates, key=lambda pair: (pair[0], -pair[1])
+        )
+    return neighbours
+
+
+def save_neighbours(neighbours, stale_ids=()):
+    """
+    Заменяет строки похожих для пачки произведений в одной транзакции.
+
+    В той же транзакции из очереди удаляются stale_ids: при сбое они
+    останутся в очереди вместе с несохранённым результатом.
+    """
+    with transaction.atomic():
+        if stale_ids:
+            SimilarTitlesQueue.objects.filter(
+                title_id__in=list(stale_ids)
+            ).delete()
+        SimilarTitle.objects.filter(title_id__in=list(neighbours)).delete()
+        SimilarTitle.objects.bulk_create(
+            SimilarTitle(title_id=title_id, position=position,
+                         similar_id=similar_id, score=score)
+            for title_id, pairs in neighbours.items()
+            for position, (score, similar_id) in enumerate(pairs, 1)
+        )
+
+
+def build_similar_titles(title_ids=None, size=SIMILAR_TITLES_SIZE,
+                         min_common=SIMILAR_TITLES_MIN_COMMON,
+                         batch_size=SIMILAR_TITLES_BATCH_SIZE):
+    """
+    Пересобирает похожие для title_ids или, без них, для всего каталога.
+
+    Полная сборка читает отзывы один раз и пишет результат пачками
+    по batch_size произведений. Частичная на каждую пачку читает
+    только строки авторов, оценивших её произведения. Возвращает
+    количество пересчитанных произведений.
+    """
+    norms = title_norms()
+    if title_ids is None:
+        SimilarTitle.objects.exclude(
+            title_id__in=Review.objects.values('title_id')
+        ).delete()
+        ratings = author_ratings()
+        title_ids = sorted(norms)
+        for batch in chunked(title_ids, batch_size):
+            save_neighbours(
+                nearest_titles(batch, ratings, norms, size, min_common)
+            )
+        return len(title_ids)
+    title_ids = sorted(set(title_ids))
+    for batch in chunked(title_ids, batch_size):
+        save_neighbours(nearest_titles(
+            batch, author_ratings(batch), norms, size, min_common
+        ))
+    return len(title_ids)
+
+
+def mark_stale(title_ids):
+    """Ставит произведения в очередь пересчёта похожих одной вставкой."""
+    SimilarTitlesQueue.objects.bulk_create(
+        (SimilarTitlesQueue(title_id=title_id) for title_id in title_ids),
+        ignore_conflicts=True,
+    )
+
+
+def co_rated_titles(title_ids):
+    """Произведения, у которых есть общие оценщики с title_ids."""
+    return Review.objects.order_by().filter(
+        author__in=Review.objects.filter(
+            title_id__in=title_ids
+        ).values('author_id')
+    ).values_list('title_id', flat=True).distinct()
+
+
+def refresh_stale_titles(size=SIMILAR_TITLES_SIZE,
+                         min_common=SIMILAR_TITLES_MIN_COMMON,
+                         batch_size=SIMILAR_TITLES_BATCH_SIZE):
+    """
+    Пересобирает похожие только для произведений из очереди.
+
+    Изменённый вектор оценок сдвигает близость ко всем произведениям
+    с общими оценщиками, поэтому пересчитываются и они, и те, в списках
+    которых изменённые уже стоят. Другие пары не меняются. Очередь
+    читается один раз: строки удаляются в транзакции с результатом
+    своей пачки, а отзывы, изменённые во время расчёта, попадут
+    в следующий запуск. Возвращает количество пересчитанных
+    произведений.
+    """
+    stale = sorted(SimilarTitlesQueue.objects.values_list(
+        'title_id', flat=True
+    ))
+    norms = title_norms()
+    done = set()
+    for batch in chunked(stale, batch_size):
+        title_ids = set(batch)
+        title_ids.update(co_rated_titles(batch))
+        title_ids.update(SimilarTitle.objects.filter(
+            similar_id__in=batch
+        ).values_list('title_id', flat=True))
+        title_ids = sorted(title_ids - done)
+        neighbours = {}
+        for chunk in chunked(title_ids, batch_size):
+            neighbours.update(nearest_titles(
+                chunk, author_ratings(chunk), norms, size, min_common
+            ))
+        save_neighbours(neighbours, stale_ids=batch)
+        done.update(title_ids)
+    return len(done)
@@ -0,0 +1,26 @@
+import pytest
+from django.core.cache import cache
+
+from api import indexes
+from api.indexes import MEMORY_INDEXES
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(settings, tmp_path, monkeypatch):
+    # Кэш общий для воркеров, как в проде: с кэшем в памяти процесса
+    # версии, ETag и кэш ответов отключены (api.cache.shared_cache()).
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path / 'cache'),
+        }
+    }
+    # Индексы в памяти пересобираются сразу, а не в фоновом потоке.
+    monkeypatch.setattr(indexes, 'run_in_background', lambda func: func())
+    cache.clear()
+    for index in MEMORY_INDEXES:
+        index.reset()
+    yield
+    cache.clear()
+    for index in MEMORY_INDEXES:
+        index.reset()
@@ -0,0 +1,391 @@
+from http import HTTPStatus
+from importlib import import_module
+from io import StringIO
+
+import pytest
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from reviews import leaderboards
+from reviews.models import (Leaderboard, Review, SimilarTitlesQueue,
+                            Title)
+from tests.utils import create_single_review, create_titles
+from users.models import User
+
+
+@pytest.mark.django_db(transaction=True)
+class Test08TitleRating:
+
+    TITLE_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+    REVIEW_DETAIL_URL_TEMPLATE = (
+        '/api/v1/titles/{title_id}/reviews/{review_id}/'
+    )
+    TOP_URL = '/api/v1/titles/top/'
+
+    def get_rating(self, client, title_id):
+        response = client.get(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=title_id)
+        )
+        assert response.status_code == HTTPStatus.OK
+        return response.json().get('rating')
+
+    def test_01_rating_follows_review_changes(self, client, admin_client,
+                                              user_client, moderator_client):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        review = create_single_review(
+            user_client, title_id, 'Отзыв пользователя', 3
+        ).json()
+        create_single_review(moderator_client, title_id, 'Отзыв модера', 8)
+        assert self.get_rating(client, title_id) == 5, (
+            'Проверьте, что при создании отзыва рейтинг произведения '
+            'пересчитывается.'
+        )
+
+        url = self.REVIEW_DETAIL_URL_TEMPLATE.format(
+            title_id=title_id, review_id=review['id']
+        )
+        response = user_client.patch(url, data={'score': 10})
+        assert response.status_code == HTTPStatus.OK
+        assert self.get_rating(client, title_id) == 9, (
+            'Проверьте, что при изменении оценки рейтинг произведения '
+            'пересчитывается.'
+        )
+
+        response = user_client.delete(url)
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert self.get_rating(client, title_id) == 8, (
+            'Проверьте, что при удалении отзыва рейтинг произведения '
+            'пересчитывается.'
+        )
+        assert self.get_rating(client, titles[1]['id']) is None, (
+            'Рейтинг произведения без отзывов должен быть `None`.'
+        )
+
+    def get_top(self, client, query=''):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(self.TOP_URL + query)
+        assert response.status_code == HTTPStatus.OK
+        assert len(context.captured_queries) == 1, (
+            f'Проверьте, что `{self.TOP_URL}` читает топ одним запросом.'
+        )
+        return [(row['id'], row['rating']) for row in response.json()]
+
+    def test_02_leaderboards_follow_review_changes(
+            self, client, admin_client, user_client, moderator_client):
+        titles, categories, genres = create_titles(admin_client)
+        first, second = titles[0]['id'], titles[1]['id']
+        create_single_review(user_client, first, 'Отзыв пользователя', 3)
+        create_single_review(moderator_client, first, 'Отзыв модера', 8)
+        review = create_single_review(
+            user_client, second, 'Второй отзыв', 9
+        ).json()
+
+        assert self.get_top(client) == [(second, 9), (first, 5)], (
+            f'Проверьте, что `{self.TOP_URL}` возвращает произведения '
+            'по убыванию рейтинга.'
+        )
+        assert self.get_top(
+            client, f'?genre={genres[0]["slug"]}'
+        ) == [(first, 5)]
+        assert self.get_top(
+            client, f'?category={categories[1]["slug"]}'
+        ) == [(second, 9)]
+        assert self.get_top(client, '?genre=unknown') == []
+
+        response = user_client.patch(
+            self.REVIEW_DETAIL_URL_TEMPLATE.format(
+                title_id=second, review_id=review['id']
+            ),
+            data={'score': 1}
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert self.get_top(client) == [(first, 5), (second, 1)], (
+            'Проверьте, что топ обновляется при изменении оценки.'
+        )
+
+        response = admin_client.delete(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=first)
+        )
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert self.get_top(client) == [(second, 1)]
+        assert self.get_top(client, f'?genre={genres[0]["slug"]}') == []
+
+        response = client.get(
+            f'{self.TOP_URL}?genre={genres[0]["slug"]}'
+            f'&category={categories[0]["slug"]}'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_03_score_histogram(self, client, admin_client, user_client,
+                                moderator_client):
+        titles, _, _ = create_titles(admin_client)
+        first, second = titles[0]['id'], titles[1]['id']
+        review = create_single_review(
+            user_client, first, 'Отзыв пользователя', 3
+        ).json()
+        create_single_review(moderator_client, first, 'Отзыв модера', 8)
+        url = self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=first)
+
+        response = client.get(url)
+        assert 'histogram' not in response.json(), (
+            'Распределение оценок отдаётся только по `?histogram=1`.'
+        )
+        histogram = client.get(f'{url}?histogram=1').json()['histogram']
+        assert histogram == {
+            str(score): int(score in (3, 8)) for score in range(1, 11)
+        }, (
+            'Проверьте, что `?histogram=1` добавляет к произведению '
+            'количество отзывов с каждой оценкой.'
+        )
+
+        review_url = self.REVIEW_DETAIL_URL_TEMPLATE.format(
+            title_id=first, review_id=review['id']
+        )
+        user_client.patch(review_url, data={'score': 8})
+        histogram = client.get(f'{url}?histogram=1').json()['histogram']
+        assert histogram['3'] == 0 and histogram['8'] == 2, (
+            'Проверьте, что распределение оценок обновляется при '
+            'изменении оценки.'
+        )
+        user_client.delete(review_url)
+
+        response = client.get(
+            f'/api/v1/titles/histograms/?ids={second},{first},100500'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == [
+            {'id': second,
+             'histogram': {str(score): 0 for score in range(1, 11)}},
+            {'id': first,
+             'histogram': {str(score): int(score == 8)
+                           for score in range(1, 11)}},
+        ], (
+            'Проверьте, что `/api/v1/titles/histograms/` возвращает '
+            'распределения в порядке запрошенных id и пропускает '
+            'несуществующие.'
+        )
+        response = client.get('/api/v1/titles/histograms/?ids=1,x')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_04_weighted_rating_ordering(self, client):
+        authors = [
+            User.objects.create(username=f'critic{idx}',
+                                email=f'critic{idx}@yamdb.fake')
+            for idx in range(20)
+        ]
+        single = Title.objects.create(name='Один отзыв', year=2000)
+        classic = Title.objects.create(name='Классика', year=1960)
+        flop = Title.objects.create(name='Провал', year=2010)
+        unrated = Title.objects.create(name='Без отзывов', year=2020)
+        Review.objects.create(title=single, author=authors[0], text='-',
+                              score=10)
+        for author in authors:
+            Review.objects.create(title=classic, author=author, text='-',
+                                  score=9)
+            Review.objects.create(title=flop, author=author, text='-',
+                                  score=2)
+
+        def ids(query):
+            response = client.get(f'/api/v1/titles/{query}')
+            assert response.status_code == HTTPStatus.OK
+            return [title['id'] for title in response.json()['results']]
+
+        assert ids('?ordering=-rating')[:3] == [single.id, classic.id,
+                                                flop.id]
+        detail_url = self.TITLE_DETAIL_URL_TEMPLATE.format(
+            title_id=single.id
+        )
+        assert client.get(detail_url).json()['weighted_rating'] is None
+        with CaptureQueriesContext(connection) as context:
+            call_command('recalculate_weighted_ratings', chunk_size=2,
+                         stdout=StringIO())
+        updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        assert updates and not any(
+            'reviews_review' in sql for sql in updates
+        ), (
+            'Проверьте, что взвешенный рейтинг считается по хранимым '
+            'сумме и количеству оценок, без подзапросов к отзывам.'
+        )
+        assert Title.objects.get(pk=unrated.pk).weighted_rating is None
+        weighted = client.get(detail_url).json()['weighted_rating']
+        assert weighted == pytest.approx(
+            Title.objects.get(pk=single.pk).weighted_rating
+        ), 'Проверьте, что ответ произведения показывает взвешенный рейтинг.'
+        expected = [classic.id, single.id, flop.id]
+        assert ids('?ordering=-weighted_rating')[:3] == expected, (
+            'Проверьте, что взвешенный рейтинг поднимает произведения '
+            'с большим количеством отзывов над единичными оценками.'
+        )
+        assert ids(
+            '?pagination=cursor&ordering=-weighted_rating'
+        )[:3] == expected
+        response = client.get('/api/v1/titles/?ordering=-weighted_rating')
+        assert [
+            title['weighted_rating'] for title in response.json()['results']
+        ][:3] == sorted(
+            Title.objects.filter(rating_count__gt=0).values_list(
+                'weighted_rating', flat=True
+            ), reverse=True
+        )
+
+    def test_05_similar_titles(self, client):
+        authors = [
+            User.objects.create(username=f'fan{idx}',
+                                email=f'fan{idx}@yamdb.fake')
+            for idx in range(4)
+        ]
+        titles = {
+            name: Title.objects.create(name=name, year=2000)
+            for name in ('A', 'B', 'C', 'D', 'E')
+        }
+        scores = {
+            'A': (10, 9, 2, 1),
+            'B': (10, 8, 2, 1),
+            'C': (1, 2, 9, 10),
+            'D': (10,),
+        }
+        for name, title_scores in scores.items():
+            for author, score in zip(authors, title_scores):
+                Review.objects.create(title=titles[name], author=author,
+                                      text='-', score=score)
+        call_command('build_similar_titles', '--all', stdout=StringIO())
+
+        def similar(name):
+            response = client.get(
+                f'/api/v1/titles/{titles[name].id}/similar/'
+            )
+            assert response.status_code == HTTPStatus.OK
+            return [title['id'] for title in response.json()]
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                f'/api/v1/titles/{titles["A"].id}/similar/'
+            )
+        assert len(context.captured_queries) == 1, (
+            'Проверьте, что похожие произведения читаются одним запросом.'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert [title['id'] for title in response.json()] == [
+            titles['B'].id, titles['C'].id
+        ], (
+            'Проверьте, что похожие упорядочены по косинусной близости, '
+            'а произведения с одним общим оценщиком не попадают в список.'
+        )
+        assert similar('E') == []
+        response = client.get('/api/v1/titles/0/similar/')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        for author, score in zip(authors, scores['A']):
+            Review.objects.create(title=titles['E'], author=author,
+                                  text='-', score=score)
+        Review.objects.filter(title=titles['C'], author=authors[0]).delete()
+        call_command('build_similar_titles', stdout=StringIO())
+        assert similar('E')[0] == titles['A'].id, (
+            'Проверьте, что без --all пересчитываются произведения '
+            'с изменёнными отзывами.'
+        )
+        assert similar('A')[0] == titles['E'].id, (
+            'Проверьте, что пересчитываются и произведения, в списках '
+            'которых стоят изменённые.'
+        )
+        assert not SimilarTitlesQueue.objects.exists()
+
+        call_command('build_similar_titles', '--all', '--size', '1',
+                     stdout=StringIO())
+        assert similar('B') == [titles['A'].id]
+        twin = Title.objects.create(name='F', year=2000)
+        for author, score in zip(authors, scores['B']):
+            Review.objects.create(title=twin, author=author, text='-',
+                                  score=score)
+        call_command('build_similar_titles', '--size', '1',
+                     stdout=StringIO())
+        assert similar('B') == [twin.id], (
+            'Проверьте, что без --all пересчитываются произведения '
+            'с общими оценщиками, в списки которых изменённые '
+            'должны войти впервые.'
+        )
+
+    def test_06_rating_with_expression_or_deferred_score(self, client):
+        authors = [
+            User.objects.create(username=f'voter{idx}',
+                                email=f'voter{idx}@yamdb.fake')
+            for idx in range(2)
+        ]
+        title = Title.objects.create(name='Произведение', year=2000)
+        for author in authors:
+            Review.objects.create(title=title, author=author, text='-',
+                                  score=4)
+
+        review = Review.objects.get(title=title, author=authors[0])
+        review.score = F('score') + 2
+        review.save()
+        deferred = Review.objects.only('id', 'title_id', 'text').get(
+            title=title, author=authors[1]
+        )
+        deferred.text = 'Без оценки в выборке'
+        deferred.save()
+        title.refresh_from_db()
+        assert (title.rating_sum, title.rating_count) == (10, 2), (
+            'Проверьте, что оценка, записанная выражением или не '
+            'загруженная из БД, учитывается в рейтинге по значению из БД.'
+        )
+
+        Review.objects.only('id', 'title_id').filter(
+            author=authors[0]
+        ).delete()
+        title.refresh_from_db()
+        assert (title.rating_sum, title.rating_count) == (4, 1)
+
+    def test_07_rolled_back_leaderboard_updates_are_dropped(
+            self, monkeypatch):
+        refreshed = []
+        monkeypatch.setattr(
+            leaderboards, 'refresh_title',
+            lambda title_id, scopes=None: refreshed.append((title_id, scopes))
+        )
+        title = Title.objects.create(name='Произведение', year=2000)
+        refreshed.clear()
+        scope = (leaderboards.Scope.GENRE, 1)
+
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                leaderboards.refresh_title_on_commit(title.pk)
+                raise RuntimeError
+        assert refreshed == []
+        with transaction.atomic():
+            leaderboards.refresh_title_on_commit(title.pk, [scope])
+            leaderboards.refresh_title_on_commit(title.pk, [scope])
+        assert refreshed == [(title.pk, {scope})], (
+            'Проверьте, что отложенные обновления топов отменённой '
+            'транзакции отбрасываются, а в одной транзакции топы '
+            'произведения пересчитываются один раз.'
+        )
+
+    def test_08_backfilled_leaderboard_breaks_ties_like_refresh(self):
+        Title.objects.bulk_create(
+            Title(name=f'Произведение {idx}', year=2000, rating=7)
+            for idx in range(3)
+        )
+        leaderboards.rebuild_all()
+
+        def board():
+            return list(Leaderboard.objects.filter(
+                scope=Leaderboard.Scope.OVERALL
+            ).order_by('position').values_list('title_id', flat=True))
+
+        refreshed = board()
+        Leaderboard.objects.all().delete()
+        import_module(
+            'reviews.migrations.0008_leaderboard'
+        ).fill_leaderboards(apps, None)
+        assert board() == refreshed, (
+            'Проверьте, что миграция заполняет топы в том же порядке '
+            'при равном рейтинге, что и их пересчёт.'
+        )
@@ -0,0 +1,599 @@
+from http import HTTPStatus
+
+import json
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api import views
+from api.fragments import (FragmentJSONRenderer, FragmentListMixin,
+                           fragment_cache_used, title_fragments)
+from api.fast_serializers import (CommentValuesSerializer,
+                                  ReviewValuesSerializer,
+                                  TitleValuesSerializer)
+from api.serializers import (CommentSerializer, ReviewSerializer,
+                             TitleReadOnlySerializer)
+from reviews.models import Category, Comment, Genre, Review, Title
+from users.models import User
+
+TITLES_QUERY_BUDGET = 3
+
+
+def create_catalog(size, offset=0):
+    category = Category.objects.create(
+        name=f'Категория {offset}', slug=f'category-{offset}'
+    )
+    genres = [
+        Genre.objects.create(name=f'Жанр {offset}-{idx}',
+                             slug=f'genre-{offset}-{idx}')
+        for idx in range(3)
+    ]
+    for idx in range(size):
+        title = Title.objects.create(
+            name=f'Произведение {offset + idx}',
+            year=2000,
+            category=category
+        )
+        title.genre.set(genres)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test09TitleQueries:
+
+    TITLES_URL = '/api/v1/titles/'
+    TITLES_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        return len(context.captured_queries)
+
+    def test_01_title_list_query_budget(self, client):
+        create_catalog(2)
+        small_page = self.count_queries(client, self.TITLES_URL)
+        create_catalog(10, offset=2)
+        full_page = self.count_queries(client, self.TITLES_URL)
+        # На последней странице count известен без COUNT(*).
+        assert small_page <= full_page, (
+            f'Проверьте, что количество запросов к БД для `{self.TITLES_URL}` '
+            'не зависит от количества произведений на странице.'
+        )
+        assert full_page <= TITLES_QUERY_BUDGET, (
+            f'Проверьте, что GET-запрос к `{self.TITLES_URL}` выполняет не '
+            f'больше {TITLES_QUERY_BUDGET} запросов к БД.'
+        )
+
+    def test_02_title_detail_query_budget(self, client):
+        create_catalog(1)
+        title = Title.objects.get()
+        url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+        assert self.count_queries(client, url) <= 2, (
+            f'Проверьте, что GET-запрос к `{self.TITLES_DETAIL_URL_TEMPLATE}` '
+            'выполняет не больше двух запросов к БД.'
+        )
+
+    def test_03_cached_title_list(self, client, admin_client):
+        create_catalog(3)
+        first = client.get(self.TITLES_URL).json()
+        assert self.count_queries(client, self.TITLES_URL) == 0, (
+            f'Проверьте, что повторный GET-запрос анонима к '
+            f'`{self.TITLES_URL}` отдаётся из кэша без запросов к БД.'
+        )
+        response = admin_client.post(self.TITLES_URL, data={
+            'name': 'Новое произведение',
+            'year': 2001,
+            'genre': ['genre-0-0'],
+            'category': 'category-0',
+        })
+        assert response.status_code == HTTPStatus.CREATED
+        second = client.get(self.TITLES_URL).json()
+        assert second['count'] == first['count'] + 1, (
+            'Проверьте, что кэш списка произведений сбрасывается после '
+            'создания произведения.'
+        )
+
+    def test_04_title_full_text_search(self, client):
+        create_catalog(3)
+        Title.objects.create(
+            name='Тёмный рыцарь', year=2008,
+            description='Бэтмен против Джокера'
+        )
+        other = Title.objects.create(
+            name='Бэтмен: начало', year=2005, description='Готэм'
+        )
+        response = client.get(f'{self.TITLES_URL}?search=бэтмен')
+        names = [title['name'] for title in response.json()['results']]
+        assert names == ['Бэтмен: начало', 'Тёмный рыцарь'], (
+            f'Проверьте, что `{self.TITLES_URL}?search=` ищет по названию '
+            'и описанию и ставит совпадения в названии выше.'
+        )
+        other.name = 'Начало'
+        other.save()
+        response = client.get(f'{self.TITLES_URL}?search=бэтм')
+        names = [title['name'] for title in response.json()['results']]
+        assert names == ['Тёмный рыцарь'], (
+            'Проверьте, что поисковый индекс обновляется при изменении '
+            'произведения.'
+        )
+        response = client.get(f'{self.TITLES_URL}?search=" OR *')
+        assert response.status_code == HTTPStatus.OK
+
+    def test_05_etag_not_modified(self, client, user_client):
+        create_catalog(2)
+        title = Title.objects.first()
+        url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+        for endpoint in (url, self.TITLES_URL, '/api/v1/genres/',
+                         '/api/v1/categories/'):
+            response = client.get(endpoint)
+            etag = response.get('ETag')
+            assert etag, (
+                f'Проверьте, что ответ на GET-запрос к `{endpoint}` '
+                'содержит заголовок ETag.'
+            )
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(endpoint, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+                f'Проверьте, что GET-запрос к `{endpoint}` с совпадающим '
+                'If-None-Match возвращает ответ со статусом 304.'
+            )
+            assert not context.captured_queries
+
+        etag = client.get(url)['ETag']
+        response = user_client.post(
+            f'{url}reviews/', data={'text': 'Отзыв', 'score': 7}
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что ETag произведения меняется после нового отзыва.'
+        )
+        assert response.json()['rating'] == 7
+
+    def test_06_sparse_fieldsets(self, admin_client):
+        create_catalog(3)
+        url = f'{self.TITLES_URL}?fields=id,name,rating'
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        for title in response.json()['results']:
+            assert set(title) == {'id', 'name', 'rating'}, (
+                f'Проверьте, что `{url}` возвращает только запрошенные поля.'
+            )
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        assert 'reviews_genretitle' not in sql
+        assert 'reviews_category' not in sql
+        assert '"description"' not in sql, (
+            'Проверьте, что поля вне ?fields= не читаются из БД.'
+        )
+
+        response = admin_client.get(f'{self.TITLES_URL}?omit=genre,category')
+        title = response.json()['results'][0]
+        assert 'genre' not in title and 'category' not in title
+        assert 'description' in title
+
+    def test_07_values_serialization_matches_drf(self, user, moderator):
+        create_catalog(4)
+        Title.objects.create(name='Без категории', year=1999)
+        for idx, title in enumerate(Title.objects.all()):
+            review = Review.objects.create(
+                title=title, author=user, text=f'Отзыв {idx}', score=idx + 1
+            )
+            Review.objects.create(
+                title=title, author=moderator, text='Ещё отзыв', score=10
+            )
+            Comment.objects.create(
+                review=review, author=moderator, text=f'Комментарий {idx}'
+            )
+        cases = (
+            (Title.objects.order_by('rating', 'pk'),
+             TitleReadOnlySerializer, TitleValuesSerializer),
+            (Review.objects.order_by('pk'),
+             ReviewSerializer, ReviewValuesSerializer),
+            (Comment.objects.order_by('pk'),
+             CommentSerializer, CommentValuesSerializer),
+        )
+        for queryset, serializer_class, values_class in cases:
+            fields = serializer_class.Meta.fields
+            fast = values_class(fields)
+            renderer = JSONRenderer()
+            assert renderer.render(
+                fast.represent(fast.values(queryset))
+            ) == renderer.render(
+                serializer_class(queryset, many=True).data
+            ), (
+                f'Быстрая сериализация для {serializer_class.__name__} '
+                'должна совпадать с ответом сериализатора DRF.'
+            )
+
+    def test_08_bulk_title_create(self, admin_client, user_client, client):
+        create_catalog(1)
+        url = f'{self.TITLES_URL}bulk/'
+        payload = [
+            {
+                'name': f'Пакетное произведение {idx}',
+                'year': 2000 + idx,
+                'genre': ['genre-0-0', 'genre-0-1'],
+                'category': 'category-0',
+            }
+            for idx in range(5)
+        ]
+        response = user_client.post(url, data=payload, format='json')
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+        invalid = payload + [{
+            'name': 'Ошибка', 'year': 2000,
+            'genre': ['unknown'], 'category': 'unknown'
+        }]
+        response = admin_client.post(url, data=invalid, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        errors = response.json()
+        assert errors[:5] == [{}] * 5 and set(errors[5]) == {
+            'genre', 'category'
+        }, 'Ошибки должны возвращаться для каждого элемента пакета.'
+        assert Title.objects.count() == 1
+
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.post(url, data=payload, format='json')
+        assert response.status_code == HTTPStatus.CREATED
+        data = response.json()
+        assert [title['name'] for title in data] == [
+            item['name'] for item in payload
+        ]
+        assert all(
+            {genre['slug'] for genre in title['genre']}
+            == {'genre-0-0', 'genre-0-1'}
+            and title['category']['slug'] == 'category-0'
+            for title in data
+        )
+        slug_lookups = [
+            query for query in context.captured_queries
+            if '"slug" IN' in query['sql']
+        ]
+        assert len(slug_lookups) == 2, (
+            'Проверьте, что slug жанров и категорий разрешаются одним '
+            'запросом на таблицу.'
+        )
+        response = client.get(f'{self.TITLES_URL}?genre=genre-0-1')
+        assert response.json()['count'] == 6
+
+    def test_09_compound_title_detail(self, client, user):
+        create_catalog(1)
+        title = Title.objects.get()
+        url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+        authors = [user] + [
+            User.objects.create(username=f'reader{idx}',
+                                email=f'reader{idx}@yamdb.fake')
+            for idx in range(11)
+        ]
+        for idx, author in enumerate(authors):
+            review = Review.objects.create(
+                title=title, author=author, text=f'Отзыв {idx}', score=5
+            )
+            Comment.objects.create(review=review, author=user, text='-')
+        Comment.objects.create(review=review, author=user, text='-')
+
+        compound_url = f'{url}?include=reviews,counts'
+        queries = self.count_queries(client, compound_url)
+        assert queries <= 4, (
+            'Проверьте, что `?include=reviews,counts` добавляет к ответу '
+            'не больше двух запросов к БД.'
+        )
+        data = client.get(compound_url).json()
+        reviews = client.get(f'{url}reviews/').json()
+        assert data['reviews'] == reviews, (
+            'Вложенные отзывы должны совпадать с первой страницей '
+            f'`{self.TITLES_DETAIL_URL_TEMPLATE}reviews/`.'
+        )
+        assert data['counts'] == {'reviews': 12, 'comments': 13}
+
+        Comment.objects.create(review=review, author=user, text='-')
+        data = client.get(compound_url).json()
+        assert data['counts']['comments'] == 14, (
+            'Проверьте, что новый комментарий сбрасывает кэш произведения.'
+        )
+        assert 'reviews' not in client.get(url).json()
+
+    def test_10_ndjson_export(self, admin_client, user_client, client,
+                              monkeypatch):
+        monkeypatch.setattr(views, 'EXPORT_CHUNK_SIZE', 3)
+        create_catalog(7)
+        url = f'{self.TITLES_URL}export/'
+        assert client.get(url).status_code == HTTPStatus.UNAUTHORIZED
+        assert user_client.get(url).status_code == HTTPStatus.FORBIDDEN
+
+        response = admin_client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            body = b''.join(response.streaming_content).decode('utf-8')
+        chunk_queries = [
+            query for query in context.captured_queries
+            if 'FROM "reviews_title"' in query['sql']
+        ]
+        assert len(chunk_queries) == 4, (
+            'Проверьте, что выгрузка читает произведения пачками по id.'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'].startswith('application/x-ndjson')
+        lines = [json.loads(line) for line in body.splitlines()]
+        titles = sorted(
+            admin_client.get(self.TITLES_URL).json()['results'],
+            key=lambda title: title['id']
+        )
+        assert lines == titles[:len(lines)] and len(lines) == 7, (
+            f'Проверьте, что `{url}` выгружает все произведения в NDJSON '
+            'в том же виде, что и список.'
+        )
+        response = admin_client.get(f'{url}?year=1999')
+        assert b''.join(response.streaming_content) == b''
+
+    def test_11_list_from_fragment_cache(self, user_client):
+        create_catalog(5)
+        events = []
+
+        def receiver(sender, **kwargs):
+            events.append((kwargs['hits'], kwargs['misses']))
+        fragment_cache_used.connect(receiver)
+        try:
+            first = user_client.get(self.TITLES_URL)
+            with CaptureQueriesContext(connection) as context:
+                second = user_client.get(self.TITLES_URL)
+            assert events == [(0, 5), (5, 0)], (
+                'Проверьте, что повторный список собирается из '
+                'закэшированных фрагментов произведений.'
+            )
+            assert second.content == first.content
+            assert not any(
+                'reviews_genretitle' in query['sql']
+                for query in context.captured_queries
+            ), 'При попадании в кэш фрагментов жанры не должны читаться.'
+
+            title = Title.objects.order_by('pk').first()
+            title.name = 'Новое название'
+            title.save()
+            response = user_client.get(self.TITLES_URL)
+            assert events[-1] == (4, 1), (
+                'Изменение произведения должно сбрасывать только его '
+                'фрагмент.'
+            )
+            assert 'Новое название' in {
+                item['name'] for item in response.json()['results']
+            }
+            Genre.objects.filter(slug='genre-0-0').update(name='Другой')
+            Genre.objects.get(slug='genre-0-0').save()
+            user_client.get(self.TITLES_URL)
+            assert events[-1] == (0, 5)
+            user_client.get(f'{self.TITLES_URL}?fields=id,name')
+            assert events[-1] == (0, 5)
+        finally:
+            fragment_cache_used.disconnect(receiver)
+        stats = title_fragments.snapshot()
+        assert stats['hits'] >= 9 and 0 < stats['hit_rate'] < 1
+
+    def test_12_batch_fetch_by_ids(self, client):
+        create_catalog(12)
+        ids = list(Title.objects.order_by('-pk').values_list('pk', flat=True))
+        requested = [ids[3], ids[0], 100500, ids[11], ids[5]]
+        url = f'{self.TITLES_URL}?ids={",".join(map(str, requested))}'
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert len(context.captured_queries) <= 2, (
+            'Проверьте, что `?ids=` читает произведения одним запросом '
+            'и жанры ещё одним.'
+        )
+        data = response.json()
+        assert [title['id'] for title in data] == [
+            pk for pk in requested if pk != 100500
+        ], 'Произведения должны идти в порядке `?ids=`, без пагинации.'
+        assert data[0] == client.get(
+            self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=ids[3])
+        ).json()
+
+        for bad in ('1,abc', '\u00b2', '1,-2', '1,+2', '9' * 5000):
+            for url in (self.TITLES_URL, f'{self.TITLES_URL}histograms/'):
+                response = client.get(url, {'ids': bad})
+                assert response.status_code == HTTPStatus.BAD_REQUEST, (
+                    'Проверьте, что неверный id в `?ids=` даёт 400.'
+                )
+        huge = ','.join(str(pk) for pk in range(1, 30001))
+        started = time.perf_counter()
+        response = client.get(self.TITLES_URL, {'ids': huge})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert time.perf_counter() - started < 1, (
+            'Проверьте, что слишком длинный `?ids=` отклоняется сразу.'
+        )
+        too_many = ','.join(str(pk) for pk in range(1, 300))
+        response = client.get(f'{self.TITLES_URL}?ids={too_many}')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        batch = ','.join(str(pk) for pk in range(1, 151))
+        response = client.get(f'{self.TITLES_URL}?ids={batch}')
+        assert response.status_code == HTTPStatus.OK
+        response = client.get(f'{self.TITLES_URL}histograms/?ids={batch}')
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что лимит `?ids=` списка не меняет лимит '
+            '`/titles/histograms/`.'
+        )
+
+    def test_13_name_slug_list_follows_writes(self, client, admin_client):
+        create_catalog(1)
+        url = '/api/v1/genres/'
+        response = admin_client.post(
+            url, data={'name': 'Western', 'slug': 'western'}
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        names = [genre['name'] for genre in client.get(
+            f'{url}?search=WEST'
+        ).json()['results']]
+        assert names == ['Western'], (
+            'Проверьте, что запись через вьюсет видна в списке, '
+            'а поиск не учитывает регистр ASCII.'
+        )
+        assert client.get(f'{url}?search=жанр').json()['count'] == 0
+        response = admin_client.delete(f'{url}western/')
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert client.get(url).json()['count'] == 3
+
+        for url, names in (
+            ('/api/v1/genres/?search=Жанр -1', ['Жанр 0-1']),
+            ('/api/v1/categories/', ['Категория 0']),
+        ):
+            client.get(url)
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            assert [row['name'] for row in response.json()['results']] == (
+                names
+            )
+            assert not context.captured_queries, (
+                f'Проверьте, что список и поиск `{url}` отдаются из '
+                'снимка справочника в памяти.'
+            )
+
+    def test_14_title_write_queries_do_not_depend_on_genres(
+            self, admin_client):
+        category = Category.objects.create(name='Фильмы', slug='films')
+        slugs = [
+            Genre.objects.create(name=f'Жанр {idx}', slug=f'genre-{idx}').slug
+            for idx in range(12)
+        ]
+
+        def count_writes(method, url, genres):
+            with CaptureQueriesContext(connection) as context:
+                response = method(url, data={
+                    'name': 'Произведение', 'year': 2000,
+                    'category': category.slug, 'genre': genres,
+                }, format='json')
+            assert response.status_code in (HTTPStatus.OK,
+                                             HTTPStatus.CREATED)
+            return response.json(), len(context.captured_queries)
+
+        one, few_queries = count_writes(
+            admin_client.post, self.TITLES_URL, slugs[:1]
+        )
+        many, many_queries = count_writes(
+            admin_client.post, self.TITLES_URL, slugs[:10]
+        )
+        assert few_queries == many_queries, (
+            'Проверьте, что количество запросов при создании произведения '
+            'не зависит от количества жанров.'
+        )
+        assert {genre['slug'] for genre in many['genre']} == set(slugs[:10])
+
+        url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=one['id'])
+        _, patch_one = count_writes(admin_client.patch, url, slugs[1:3])
+        url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=many['id'])
+        patched, patch_many = count_writes(
+            admin_client.patch, url, slugs[5:12]
+        )
+        assert patch_one == patch_many, (
+            'Проверьте, что количество запросов при изменении жанров '
+            'произведения не зависит от их количества.'
+        )
+        assert {genre['slug'] for genre in patched['genre']} == set(
+            slugs[5:12]
+        )
+        assert set(Title.objects.get(pk=many['id']).genre.values_list(
+            'slug', flat=True
+        )) == set(slugs[5:12])
+
+        response = admin_client.patch(
+            url, data={'genre': ['genre-0', 'unknown']}, format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_15_comment_invalidates_only_its_title(self, client, user,
+                                                   user_client):
+        create_catalog(1)
+        title = Title.objects.get()
+        review = Review.objects.create(title=title, author=user, text='-',
+                                       score=5)
+        detail_url = self.TITLES_DETAIL_URL_TEMPLATE.format(
+            title_id=title.id
+        ) + '?include=counts'
+        list_etag = client.get(self.TITLES_URL)['ETag']
+        detail = client.get(detail_url)
+        assert detail.json()['counts']['comments'] == 0
+
+        comments_url = (
+            f'{self.TITLES_URL}{title.id}/reviews/{review.id}/comments/'
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.post(comments_url, data={'text': 'Да'})
+        assert response.status_code == HTTPStatus.CREATED
+        assert len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "reviews_review"' in query['sql']
+        ]) == 1, (
+            'Проверьте, что запись комментария не перечитывает отзыв, '
+            'чтобы найти произведение.'
+        )
+        response = client.get(self.TITLES_URL, HTTP_IF_NONE_MATCH=list_etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+            'Проверьте, что комментарий не сбрасывает кэш списков.'
+        )
+        response = client.get(detail_url, HTTP_IF_NONE_MATCH=detail['ETag'])
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['counts']['comments'] == 1, (
+            'Проверьте, что комментарий сбрасывает кэш своего произведения.'
+        )
+
+    def test_16_fragment_envelope(self):
+        envelope = FragmentListMixin.render_envelope(
+            {'count': 2, 'next': None, 'results': [], 'estimated': True},
+            b'[{"id":1},{"id":2}]'
+        )
+        assert json.loads(envelope) == {
+            'count': 2, 'next': None, 'results': [{'id': 1}, {'id': 2}],
+            'estimated': True,
+        }, (
+            'Проверьте, что ответ пагинатора собирается по его полям, '
+            'в каком бы порядке они ни шли.'
+        )
+        view = views.TitleViewSet()
+        view.action = 'retrieve'
+        assert not any(
+            isinstance(renderer, FragmentJSONRenderer)
+            for renderer in view.get_renderers()
+        ), 'Рендерер фрагментов должен использоваться только для списка.'
+
+    def test_17_browsable_title_list(self, client):
+        create_catalog(1)
+        name = Title.objects.values_list('name', flat=True).first()
+        for response in (
+            client.get(self.TITLES_URL, HTTP_ACCEPT='text/html'),
+            client.get(self.TITLES_URL, {'format': 'api'}),
+            client.get(self.TITLES_URL, {'format': 'api', 'ids': '1'}),
+        ):
+            assert response.status_code == HTTPStatus.OK, (
+                'Проверьте, что список произведений открывается '
+                'в HTML-интерфейсе DRF.'
+            )
+            assert response['Content-Type'].startswith('text/html')
+        assert name in client.get(
+            self.TITLES_URL, HTTP_ACCEPT='text/html'
+        ).content.decode()
+
+    def test_18_process_local_cache_disables_versions(self, client,
+                                                       settings):
+        settings.CACHES = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+        create_catalog(1)
+        title = Title.objects.get()
+        detail_url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+        for url in (self.TITLES_URL, detail_url, '/api/v1/genres/'):
+            response = client.get(url)
+            assert response.status_code == HTTPStatus.OK
+            assert 'ETag' not in response, (
+                'Проверьте, что без общего кэша ETag не отдаётся: версии '
+                'других воркеров в кэше процесса не видны.'
+            )
+        # Запись другого воркера: сигналы этого процесса её не видят.
+        Title.objects.filter(pk=title.pk).update(name='Переименовано')
+        assert client.get(self.TITLES_URL).json()['results'][0]['name'] == (
+            'Переименовано'
+        ), 'Проверьте, что без общего кэша ответы не кэшируются.'
+        assert client.get(detail_url).json()['name'] == 'Переименовано'
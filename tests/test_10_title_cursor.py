@@ -0,0 +1,145 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+
+from api.pagination import EstimatedCountPagination
+from reviews.models import Review, Title
+from users.models import User
+
+
+@pytest.mark.django_db(transaction=True)
+class Test10TitleCursorPagination:
+
+    TITLES_URL = '/api/v1/titles/'
+
+    def walk(self, client, ordering):
+        url = f'{self.TITLES_URL}?pagination=cursor&ordering={ordering}'
+        names = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == HTTPStatus.OK
+            data = response.json()
+            assert 'count' not in data, (
+                'Курсорная пагинация не должна считать количество объектов.'
+            )
+            names.extend(title['name'] for title in data['results'])
+            url = data['next']
+        return names
+
+    def test_01_cursor_walks_whole_catalog(self, client):
+        for idx in range(25):
+            Title.objects.create(
+                name=f'Произведение {idx:02}',
+                year=2000,
+                rating=None if idx % 3 == 0 else idx % 4,
+            )
+        for ordering in ('rating', '-rating', 'name', '-name'):
+            descending = ordering.startswith('-')
+            field = ordering.lstrip('-')
+            titles = Title.objects.all()
+            nulls = sorted(
+                (title for title in titles if getattr(title, field) is None),
+                key=lambda title: title.pk, reverse=descending
+            )
+            values = sorted(
+                (title for title in titles
+                 if getattr(title, field) is not None),
+                key=lambda title: (getattr(title, field), title.pk),
+                reverse=descending
+            )
+            ordered = values + nulls if descending else nulls + values
+            expected = [title.name for title in ordered]
+            assert self.walk(client, ordering) == expected, (
+                'Проверьте, что курсорная пагинация с сортировкой '
+                f'`{ordering}` возвращает все произведения ровно один раз '
+                'и в правильном порядке.'
+            )
+
+    def test_02_invalid_cursor(self, client):
+        response = client.get(
+            f'{self.TITLES_URL}?pagination=cursor&cursor=broken'
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_03_estimated_count(self, client, monkeypatch):
+        monkeypatch.setattr(EstimatedCountPagination, 'count_threshold', 3)
+        monkeypatch.setattr(EstimatedCountPagination, 'page_size', 2)
+        for idx in range(6):
+            Title.objects.create(name=f'Произведение {idx}', year=2000 + idx)
+        title = Title.objects.get(year=2000)
+        for idx in range(5):
+            author = User.objects.create(username=f'reader{idx}',
+                                         email=f'reader{idx}@yamdb.fake')
+            Review.objects.create(title=title, author=author, text='-',
+                                  score=5)
+
+        data = client.get(f'{self.TITLES_URL}?year=2001').json()
+        assert (data['count'], data['count_estimated']) == (1, False), (
+            'Ниже порога количество должно считаться точно.'
+        )
+        data = client.get(f'{self.TITLES_URL}?year_min=2001').json()
+        assert (data['count'], data['count_estimated']) == (5, False), (
+            'Без оценки для выборки с фильтрами количество считается точно.'
+        )
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            data = client.get(self.TITLES_URL).json()
+            assert (data['count'], data['count_estimated']) == (6, True), (
+                'Выше порога количество должно браться из статистики БД '
+                'и помечаться как приблизительное.'
+            )
+        data = client.get(f'{self.TITLES_URL}{title.id}/reviews/').json()
+        assert (data['count'], data['count_estimated']) == (5, True), (
+            'Количество отзывов выше порога должно браться из счётчика '
+            'произведения.'
+        )
+        assert len(data['results']) == 2
+
+    def test_04_low_estimate_does_not_hide_pages(self, client, monkeypatch):
+        if connection.vendor != 'sqlite':
+            pytest.skip('Статистика таблиц задаётся через ANALYZE SQLite.')
+        monkeypatch.setattr(EstimatedCountPagination, 'count_threshold', 3)
+        for idx in range(36):
+            Title.objects.create(name=f'Произведение {idx}', year=2000)
+            if idx == 5:
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+        data = client.get(self.TITLES_URL).json()
+        assert data['count_estimated'] is True
+        assert data['count'] >= 11, (
+            'Оценка не может быть меньше уже прочитанных строк.'
+        )
+        assert data['next'] is not None, (
+            'Проверьте, что следующая страница определяется по строкам, '
+            'а не по заниженной оценке количества.'
+        )
+        data = client.get(f'{self.TITLES_URL}?page=4').json()
+        assert len(data['results']) == 6
+        assert data['next'] is None
+        assert (data['count'], data['count_estimated']) == (36, False), (
+            'На последней странице количество должно быть точным.'
+        )
+        response = client.get(f'{self.TITLES_URL}?page=5')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        def last_page():
+            response = client.get(f'{self.TITLES_URL}?page=last')
+            assert response.status_code == HTTPStatus.OK, (
+                'Проверьте, что `?page=last` находит последнюю страницу '
+                'по точному количеству, а не по оценке.'
+            )
+            return response.json()
+
+        data = last_page()
+        assert (len(data['results']), data['next']) == (6, None)
+        assert (data['count'], data['count_estimated']) == (36, False)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Title.objects.filter(
+            pk__in=Title.objects.order_by('pk').values('pk')[:26]
+        ).delete()
+        data = last_page()
+        assert (len(data['results']), data['previous']) == (10, None)
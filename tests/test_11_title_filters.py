@@ -0,0 +1,231 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import indexes
+from api.cache import GENRE_LINKS, TITLES, bump_version
+from api.indexes import genre_index
+from reviews.models import Category, Genre, GenreTitle, Review, Title
+
+
+@pytest.mark.django_db(transaction=True)
+class Test11TitleFilters:
+
+    TITLES_URL = '/api/v1/titles/'
+
+    def get_names(self, client, query):
+        response = client.get(f'{self.TITLES_URL}?{query}')
+        assert response.status_code == HTTPStatus.OK
+        return {title['name'] for title in response.json()['results']}
+
+    def test_01_multi_genre_filter(self, client):
+        drama = Genre.objects.create(name='Драма', slug='drama')
+        comedy = Genre.objects.create(name='Комедия', slug='comedy')
+        Genre.objects.create(name='Ужасы', slug='horror')
+        both = Title.objects.create(name='Трагикомедия', year=2000)
+        both.genre.set([drama, comedy])
+        Title.objects.create(name='Драма', year=2000).genre.add(drama)
+        Title.objects.create(name='Комедия', year=2000).genre.add(comedy)
+
+        assert self.get_names(client, 'genre=drama') == {
+            'Трагикомедия', 'Драма'
+        }
+        assert self.get_names(client, 'genre=drama,comedy') == {
+            'Трагикомедия'
+        }, 'По умолчанию произведение должно иметь все указанные жанры.'
+        assert self.get_names(
+            client, 'genre=drama,comedy&genre_mode=any'
+        ) == {'Трагикомедия', 'Драма', 'Комедия'}
+        assert self.get_names(client, 'genre=drama,horror') == set()
+        assert self.get_names(client, 'genre=unknown') == set()
+
+        both.genre.remove(comedy)
+        assert self.get_names(client, 'genre=comedy') == {'Комедия'}, (
+            'Проверьте, что индекс жанров обновляется при изменении '
+            'жанров произведения.'
+        )
+        both.delete()
+        assert self.get_names(client, 'genre=drama') == {'Драма'}
+
+        response = client.get(f'{self.TITLES_URL}?genre_mode=some')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_02_facets(self, client):
+        drama = Genre.objects.create(name='Драма', slug='drama')
+        comedy = Genre.objects.create(name='Комедия', slug='comedy')
+        films = Category.objects.create(name='Фильмы', slug='films')
+        books = Category.objects.create(name='Книги', slug='books')
+        Title.objects.create(
+            name='Трагикомедия', year=1984, category=films
+        ).genre.set([drama, comedy])
+        Title.objects.create(
+            name='Драма', year=1989, category=books
+        ).genre.add(drama)
+        Title.objects.create(name='Комедия', year=2001).genre.add(comedy)
+
+        url = f'{self.TITLES_URL}facets/'
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert len(context.captured_queries) == 3, (
+            f'Проверьте, что `{url}` считает фасеты тремя запросами.'
+        )
+        assert response.json() == {
+            'genre': {'comedy': 2, 'drama': 2},
+            'category': {'books': 1, 'films': 1},
+            'year': {'1980-1989': 2, '2000-2009': 1},
+        }
+        response = client.get(f'{url}?genre=drama&year=1984')
+        assert response.json() == {
+            'genre': {'comedy': 1, 'drama': 1},
+            'category': {'films': 1},
+            'year': {'1980-1989': 1},
+        }, f'Проверьте, что `{url}` учитывает параметры фильтрации.'
+        response = client.get(f'{url}?genre_mode=some')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_03_year_and_rating_ranges(self, client):
+        for name, year, rating in (
+            ('Старый', 1985, 9.5),
+            ('Хороший', 1995, 8.5),
+            ('Средний', 1998, 6.0),
+            ('Новый', 2010, 9.0),
+            ('Без отзывов', 1999, None),
+        ):
+            Title.objects.create(name=name, year=year, rating=rating)
+
+        assert self.get_names(client, 'year_min=1990&year_max=2000') == {
+            'Хороший', 'Средний', 'Без отзывов'
+        }
+        assert self.get_names(client, 'rating_min=8') == {
+            'Старый', 'Хороший', 'Новый'
+        }
+        assert self.get_names(
+            client, 'year_min=1990&year_max=2000&rating_min=8'
+        ) == {'Хороший'}, (
+            'Проверьте, что фильтры года и рейтинга по диапазону '
+            'работают вместе.'
+        )
+        assert self.get_names(client, 'rating_max=9') == {
+            'Хороший', 'Средний', 'Новый'
+        }
+        response = client.get(f'{self.TITLES_URL}?rating_min=abc')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_04_autocomplete(self, client, user, monkeypatch):
+        Title.objects.create(name='Крепкий орешек', year=1988)
+        second = Title.objects.create(name='Крепкий орешек 2', year=1990)
+        Title.objects.create(name='Ёлки', year=2010)
+        renamed = Title.objects.create(name='Кредо убийцы', year=2016)
+        Review.objects.create(title=second, author=user, text='-', score=9)
+        url = f'{self.TITLES_URL}autocomplete/'
+
+        def names(query):
+            response = client.get(f'{url}?q={query}')
+            assert response.status_code == HTTPStatus.OK
+            return [title['name'] for title in response.json()]
+
+        assert names('кре') == [
+            'Крепкий орешек 2', 'Кредо убийцы', 'Крепкий орешек'
+        ], 'Подсказки должны быть упорядочены по рейтингу.'
+        with CaptureQueriesContext(connection) as context:
+            assert names('ОРЕШ') == ['Крепкий орешек 2', 'Крепкий орешек']
+        assert not context.captured_queries, (
+            f'Проверьте, что `{url}` отвечает из индекса в памяти.'
+        )
+        assert names('елк') == ['Ёлки']
+        assert names('') == []
+
+        renamed.name = 'Убийство в Восточном экспрессе'
+        renamed.save()
+        second.delete()
+        assert names('кре') == ['Крепкий орешек'], (
+            'Проверьте, что индекс обновляется при изменении и удалении '
+            'произведений.'
+        )
+        assert names('убий') == ['Убийство в Восточном экспрессе']
+
+        # Пока индекс пересобирается, подсказки те же, но из БД.
+        monkeypatch.setattr(indexes, 'run_in_background', lambda func: None)
+        Title.objects.create(name='Ель', year=2000)
+        assert names('кре') == ['Крепкий орешек']
+        assert names('ел') == ['Ёлки', 'Ель']
+        assert names('елк') == ['Ёлки']
+        assert names('в вост') == ['Убийство в Восточном экспрессе']
+        assert names('ешек') == []
+
+    def test_05_memory_index_freshness(self, client, monkeypatch):
+        drama = Genre.objects.create(name='Драма', slug='drama')
+        first = Title.objects.create(name='Первое', year=2000)
+        first.genre.add(drama)
+        assert self.get_names(client, 'genre=drama') == {'Первое'}
+
+        # Фоновая пересборка ещё не закончилась.
+        pending = []
+        monkeypatch.setattr(indexes, 'run_in_background', pending.append)
+        second = Title.objects.create(name='Второе', year=2000)
+        second.genre.add(drama)
+        with CaptureQueriesContext(connection) as context:
+            names = self.get_names(client, 'genre=drama')
+        assert names == {'Первое', 'Второе'}, (
+            'Проверьте, что отставший индекс жанров не используется.'
+        )
+        assert not any(
+            'FROM "reviews_genretitle" ORDER BY' in query['sql']
+            for query in context.captured_queries
+        ), 'Проверьте, что индекс жанров не собирается в запросе.'
+        assert genre_index.titles([drama.id]) is None
+
+        # Запись другого воркера: сигналы этого процесса её не видят,
+        # но версия в общем кэше поднята.
+        third = Title.objects.create(name='Третье', year=2000)
+        GenreTitle.objects.bulk_create([GenreTitle(genre=drama, title=third)])
+        bump_version(GENRE_LINKS)
+        bump_version(TITLES)
+        assert self.get_names(client, 'genre=drama') == {
+            'Первое', 'Второе', 'Третье'
+        }
+        assert len(pending) == 1, 'Пересборка индекса не должна дублироваться.'
+        pending.pop()()
+        assert genre_index.titles([drama.id]) == sorted(
+            [first.id, second.id, third.id]
+        ), 'Проверьте, что индекс догоняет БД после пересборки.'
+
+    def test_06_cached_filtered_list_follows_writes(self, client,
+                                                    user_client,
+                                                    admin_client):
+        title = Title.objects.create(name='Произведение', year=2000)
+        urls = (f'{self.TITLES_URL}?rating_min=6',
+                f'{self.TITLES_URL}?year_max=2000')
+        etags = {}
+        for url in urls:
+            client.get(url)
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            assert not context.captured_queries
+            etags[url] = response['ETag']
+        assert self.get_names(client, 'rating_min=6') == set()
+
+        response = user_client.post(
+            f'{self.TITLES_URL}{title.id}/reviews/',
+            data={'text': 'Отзыв', 'score': 8}
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        response = client.get(urls[0], HTTP_IF_NONE_MATCH=etags[urls[0]])
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что ETag отфильтрованного списка меняется после '
+            'записи, без очистки кэша.'
+        )
+        assert [item['name'] for item in response.json()['results']] == [
+            'Произведение'
+        ], 'Проверьте, что закэшированный список обновляется после записи.'
+
+        response = admin_client.patch(
+            f'{self.TITLES_URL}{title.id}/', data={'year': 2001}
+        )
+        assert response.status_code == HTTPStatus.OK
+        response = client.get(urls[1], HTTP_IF_NONE_MATCH=etags[urls[1]])
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['results'] == []
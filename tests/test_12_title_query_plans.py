@@ -0,0 +1,142 @@
+import re
+
+import pytest
+from django.db import connection
+from django.http import QueryDict
+
+from api import filters
+from api.filters import TitleFilter
+from api.views import TitleViewSet
+from reviews.leaderboards import board_titles
+from reviews.models import Category, Genre, Leaderboard, Title
+
+# Полный просмотр таблицы без индекса (FTS5 по MATCH сюда не входит).
+FULL_SCAN = re.compile(
+    r'\bSCAN (\w+)(?!\w)(?! USING (COVERING )?INDEX| VIRTUAL TABLE INDEX)'
+)
+# Любой SCAN произведений или связей с жанрами, в том числе полный обход
+# индекса: с фильтрами эти таблицы должны читаться через SEARCH.
+TABLE_WALK = re.compile(r'\bSCAN (reviews_title|reviews_genretitle)\b')
+CATALOG_SIZE = 2000
+FILTER_QUERIES = (
+    '',
+    'year=1990',
+    'category=films',
+    'category=films&year=1990',
+    'genre=drama',
+    'genre=drama,comedy',
+    'genre=drama,comedy&genre_mode=any',
+    'genre=drama&year=1990',
+    'genre=drama&category=films&year=1990',
+    'search=терминатор',
+    'search=терминатор&year=1990',
+    'year_min=1980&year_max=2000',
+    'rating_min=8',
+    'rating_min=7&rating_max=9&year_min=1990',
+    'category=films&year_min=1980&year_max=2000',
+    'genre=drama&rating_min=8',
+)
+ORDERINGS = (('rating',), ('name', '-year'), ('-rating', '-pk'))
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'sqlite',
+    reason='Планы запросов проверяются для SQLite.'
+)
+
+
+@pytest.fixture
+def catalog():
+    """
+    Каталог, на котором у планировщика есть статистика: на одной строке
+    без ANALYZE любой план выглядит одинаково дешёвым.
+    """
+    Category.objects.bulk_create(
+        Category(name=f'Категория {idx}', slug=f'category-{idx}')
+        for idx in range(20)
+    )
+    Category.objects.create(name='Фильмы', slug='films')
+    Genre.objects.bulk_create(
+        Genre(name=f'Жанр {idx}', slug=f'genre-{idx}') for idx in range(60)
+    )
+    Genre.objects.create(name='Драма', slug='drama')
+    Genre.objects.create(name='Комедия', slug='comedy')
+    categories = list(Category.objects.order_by('pk'))
+    genres = list(Genre.objects.order_by('pk'))
+    Title.objects.bulk_create(
+        Title(
+            name=f'Терминатор {idx}' if idx % 100 == 0 else f'Фильм {idx}',
+            year=1900 + idx % 120,
+            category=categories[idx % len(categories)],
+            rating=None if idx % 7 == 0 else 1 + idx % 10,
+        )
+        for idx in range(CATALOG_SIZE)
+    )
+    title_ids = list(Title.objects.values_list('pk', flat=True))
+    Title.genre.through.objects.bulk_create(
+        Title.genre.through(
+            title_id=title_id, genre=genres[(idx + shift) % len(genres)]
+        )
+        for idx, title_id in enumerate(title_ids)
+        for shift in (0, 1)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    yield
+    with connection.cursor() as cursor:
+        # Статистика пережила бы очистку таблиц между тестами.
+        cursor.execute('DELETE FROM sqlite_stat1')
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures('catalog')
+class Test12TitleQueryPlans:
+
+    def check_plan(self, query, ordering):
+        queryset = TitleFilter(
+            QueryDict(query), queryset=TitleViewSet.queryset
+        ).qs.order_by(*ordering)
+        plan = queryset.explain()
+        scans = [match.group(1) for match in FULL_SCAN.finditer(plan)]
+        if query:
+            scans += [match.group(1) for match in TABLE_WALK.finditer(plan)]
+        assert not scans, (
+            f'Запрос `{query or "без фильтров"}` с сортировкой '
+            f'{ordering} полностью просматривает таблицы {scans}. '
+            f'План запроса:\n{plan}'
+        )
+
+    @pytest.mark.parametrize('query', FILTER_QUERIES)
+    @pytest.mark.parametrize('ordering', ORDERINGS)
+    def test_01_filters_use_indexes(self, query, ordering):
+        self.check_plan(query, ordering)
+
+    @pytest.mark.parametrize('query', [
+        query for query in FILTER_QUERIES if 'genre' in query
+    ])
+    def test_02_genre_subquery_uses_indexes(self, query, monkeypatch):
+        monkeypatch.setattr(filters, 'GENRE_INDEX_MAX_IDS', 0)
+        self.check_plan(query, ('rating',))
+
+    @pytest.mark.parametrize('scope', Leaderboard.Scope.values)
+    def test_03_leaderboard_uses_indexes(self, scope):
+        scope_id = {
+            Leaderboard.Scope.GENRE: Genre.objects.get(slug='drama').pk,
+            Leaderboard.Scope.CATEGORY: Category.objects.get(
+                slug='films'
+            ).pk,
+        }.get(scope, 0)
+        plan = board_titles(scope, scope_id).explain()
+        scans = [match.group(1) for match in FULL_SCAN.finditer(plan)]
+        if scope != Leaderboard.Scope.OVERALL:
+            scans += [match.group(1) for match in TABLE_WALK.finditer(plan)]
+        assert not scans, (
+            f'Топ раздела {scope} полностью просматривает таблицы {scans}. '
+            f'План запроса:\n{plan}'
+        )
+        if scope != Leaderboard.Scope.GENRE:
+            # Рейтинг жанрового топа лежит в другой таблице, чем жанр:
+            # сортируются только произведения жанра.
+            assert 'TEMP B-TREE' not in plan, (
+                f'Проверьте, что топ раздела {scope} читается по индексу '
+                f'в порядке сортировки. План запроса:\n{plan}'
+            )